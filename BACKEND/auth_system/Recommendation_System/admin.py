@@ -1,3 +1,10 @@
 from django.contrib import admin
 
 # Register your models here.
+from .models import ClassificationResult
+
+class ClassificationResultAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'class_label', 'created_at')
+    search_fields = ('content_hash',)
+
+admin.site.register(ClassificationResult, ClassificationResultAdmin)
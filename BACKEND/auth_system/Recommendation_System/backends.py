@@ -0,0 +1,107 @@
+import logging
+import os
+
+import torch
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = ('eager', 'torchscript', 'onnx')
+EXTENSIONS = {'torchscript': 'pt', 'onnx': 'onnx'}
+
+logger = logging.getLogger(__name__)
+
+
+def exported_path(name, backend):
+    return os.path.join(settings.RECOMMENDATION_EXPORT_DIR, f"{name}.{EXTENSIONS[backend]}")
+
+
+def example_inputs(name, batch_size=1, device='cpu'):
+    if name == 'classifier':
+        return (torch.randn(batch_size, 3, 224, 224, device=device),)
+    labels = torch.zeros(batch_size, 3, device=device)
+    labels[torch.arange(batch_size), torch.arange(batch_size) % 3] = 1
+    return (torch.randn(batch_size, 100, device=device), labels)
+
+
+def input_names(name):
+    return ['image'] if name == 'classifier' else ['noise', 'labels']
+
+
+class OnnxModel:
+    """Runs an ONNX Runtime session with torch tensors in and out, like the eager module."""
+
+    def __init__(self, path, device):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImproperlyConfigured("The 'onnx' inference backend requires the onnxruntime package.")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.device = device
+
+    def __call__(self, *inputs):
+        feeds = {name: tensor.detach().cpu().numpy() for name, tensor in zip(self.input_names, inputs)}
+        return torch.from_numpy(self.session.run(None, feeds)[0]).to(self.device)
+
+    def eval(self):
+        return self
+
+
+def load_exported(name, backend, device):
+    path = exported_path(name, backend)
+    if not os.path.exists(path):
+        raise ImproperlyConfigured(
+            f"No {backend} export of '{name}' at {path}. Run `python manage.py export_recommendation_models`."
+        )
+    if backend == 'torchscript':
+        return torch.jit.load(path, map_location=device)
+    return OnnxModel(path, device)
+
+
+def export_torchscript(model, name, path):
+    """
+    Trace, freeze and optimize for inference. Some torch releases' graph passes
+    produce a graph that can't run (e.g. the generator's Linear followed by
+    BatchNorm1d fails with "required keyword attribute 'value' is undefined"), so
+    each step's graph is tried once and the last one that runs is saved.
+    """
+    inputs = example_inputs(name, batch_size=2)
+    with torch.no_grad():
+        graph = torch.jit.trace(model, inputs).eval()
+        for step in (torch.jit.freeze, torch.jit.optimize_for_inference):
+            try:
+                candidate = step(graph)
+                candidate(*inputs)
+            except RuntimeError as e:
+                logger.warning(f"{step.__name__} failed for '{name}', saving the previous graph: {str(e)}")
+                break
+            graph = candidate
+    graph.save(path)
+
+
+def export_onnx(model, name, path):
+    names = input_names(name)
+    dynamic_axes = {input_name: {0: 'batch'} for input_name in names}
+    dynamic_axes['output'] = {0: 'batch'}
+    if name == 'classifier':
+        dynamic_axes['image'].update({2: 'height', 3: 'width'})
+    torch.onnx.export(
+        model, example_inputs(name, batch_size=2), path,
+        input_names=names, output_names=['output'],
+        dynamic_axes=dynamic_axes, opset_version=17,
+    )
+
+
+def check_parity(eager_model, exported_model, name, batch_sizes=(1, 4)):
+    """Largest absolute difference between eager and exported outputs on random inputs."""
+    torch.manual_seed(0)
+    max_diff = 0.0
+    for batch_size in batch_sizes:
+        inputs = example_inputs(name, batch_size)
+        with torch.no_grad():
+            expected = eager_model(*inputs)
+            actual = exported_model(*inputs)
+        max_diff = max(max_diff, (expected - actual).abs().max().item())
+    return max_diff
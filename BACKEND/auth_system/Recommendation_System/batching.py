@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    def __init__(self, item):
+        self.item = item
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for up to `max_wait_ms` (or until `max_batch_size`
+    requests are waiting) and hands them to `run_batch` in a single call.
+    `run_batch` takes a list of items and returns one result per item, in order.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5, name="batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._queue_latencies = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+
+    def submit(self, item, timeout=None):
+        self._ensure_worker()
+        pending = _PendingRequest(item)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError(f"{self.name}: request timed out after {timeout}s")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.run_batch([pending.item for pending in batch])
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                logger.error(f"{self.name}: batch of {len(batch)} failed: {str(e)}")
+                for pending in batch:
+                    pending.error = e
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._queue_latencies.extend((started - pending.enqueued_at) * 1000 for pending in batch)
+            for pending in batch:
+                pending.done.set()
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._queue_latencies)
+            sizes = list(self._batch_sizes)
+            batches, requests = self._batches, self._requests
+
+        def percentile(values, p):
+            return round(values[min(len(values) - 1, int(len(values) * p))], 2) if values else None
+
+        return {
+            "maxBatchSize": self.max_batch_size,
+            "maxWaitMs": self.max_wait * 1000,
+            "batches": batches,
+            "requests": requests,
+            "avgBatchSize": round(sum(sizes) / len(sizes), 2) if sizes else None,
+            "avgBatchFill": round(sum(sizes) / (len(sizes) * self.max_batch_size), 3) if sizes else None,
+            "queueLatencyMs": {
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+
+_classification_batcher = None
+_classification_batcher_lock = threading.Lock()
+
+
+def _classify_batch(img_tensors):
+    from . import ml
+    from .registry import registry
+    return ml.classify_batch(registry.get('classifier'), img_tensors, ml.CLASS_LABELS)
+
+
+def get_classification_batcher():
+    global _classification_batcher
+    if _classification_batcher is None:
+        with _classification_batcher_lock:
+            if _classification_batcher is None:
+                _classification_batcher = MicroBatcher(
+                    _classify_batch,
+                    max_batch_size=settings.RECOMMENDATION_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.RECOMMENDATION_BATCH_MAX_WAIT_MS,
+                    name="classification-batcher",
+                )
+    return _classification_batcher
@@ -0,0 +1,86 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from .models import ClassificationResult
+
+
+def hash_file(file_obj):
+    """SHA-256 of an uploaded file or an open binary file, read in chunks."""
+    digest = hashlib.sha256()
+    if hasattr(file_obj, 'chunks'):
+        for chunk in file_obj.chunks():
+            digest.update(chunk)
+    else:
+        for chunk in iter(lambda: file_obj.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ClassificationCache:
+    """
+    Classification results keyed by the SHA-256 of the image bytes, as
+    (class_label, probabilities, embedding bytes or None) tuples.
+    An in-process LRU sits in front of the ClassificationResult table.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, content_hash, result):
+        with self._lock:
+            self._entries[content_hash] = result
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, content_hash):
+        with self._lock:
+            result = self._entries.get(content_hash)
+            if result is not None:
+                self._entries.move_to_end(content_hash)
+                self.hits += 1
+                return result
+
+        row = ClassificationResult.objects.filter(content_hash=content_hash).first()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        embedding = bytes(row.embedding) if row.embedding is not None else None
+        result = (row.class_label, row.probabilities, embedding)
+        self._remember(content_hash, result)
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def set(self, content_hash, class_label, probabilities, embedding=None):
+        try:
+            ClassificationResult.objects.get_or_create(
+                content_hash=content_hash,
+                defaults={"class_label": class_label, "probabilities": probabilities, "embedding": embedding},
+            )
+        except IntegrityError:
+            pass  # Stored concurrently by another worker
+        self._remember(content_hash, (class_label, probabilities, embedding))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+classification_cache = ClassificationCache(settings.RECOMMENDATION_CLASSIFICATION_CACHE_SIZE)
@@ -0,0 +1,56 @@
+import time
+from io import BytesIO
+
+import numpy as np
+import torch
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from Recommendation_System import ml
+
+INPUT_SIZES = {
+    'small': (640, 480),
+    'medium': (1920, 1080),
+    '12mp': (4032, 3024),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare full-resolution and bounded (JPEG draft) classifier preprocessing on small, medium and 12 MP inputs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'input':<8}{'path':<10}{'ms/image':>10}{'tensor MB':>11}")
+        for label, (width, height) in INPUT_SIZES.items():
+            jpeg = synthetic_jpeg(width, height)
+            for path_name, preprocess in (('full-res', preprocess_full_resolution), ('bounded', ml.preprocess_image)):
+                elapsed, img_tensor = time_preprocess(preprocess, jpeg, options['iterations'])
+                tensor_mb = img_tensor.numel() * img_tensor.element_size() / 2 ** 20
+                self.stdout.write(f"{label:<8}{path_name:<10}{elapsed:>10.1f}{tensor_mb:>11.2f}")
+
+
+def synthetic_jpeg(width, height):
+    rng = np.random.default_rng(0)
+    # Smooth gradients plus noise compress like a photo rather than like pure noise
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 20, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def preprocess_full_resolution(image_file):
+    """The previous pipeline: decode everything, ToTensor + Normalize with no resize."""
+    img = np.asarray(Image.open(image_file).convert("RGB"), dtype=np.float32) / 255
+    img = (img - ml.IMAGENET_MEAN) / ml.IMAGENET_STD
+    return torch.from_numpy(img).permute(2, 0, 1).unsqueeze(0)
+
+
+def time_preprocess(preprocess, jpeg, iterations):
+    img_tensor = None
+    start = time.perf_counter()
+    for _ in range(iterations):
+        img_tensor = preprocess(BytesIO(jpeg))
+    return (time.perf_counter() - start) * 1000 / iterations, img_tensor
@@ -0,0 +1,48 @@
+import os
+import time
+
+import torch
+from django.core.management.base import BaseCommand
+
+from Recommendation_System import backends, ml
+
+
+class Command(BaseCommand):
+    help = "Compare latency and throughput of the eager and exported recommendation models on CPU."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', choices=backends.BACKENDS, default=list(backends.BACKENDS))
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8])
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'model':<11}{'backend':<13}{'batch':>6}{'p50 ms':>10}{'p95 ms':>10}{'items/s':>10}")
+        for name in ('classifier', 'generator'):
+            for backend in options['backends']:
+                if backend == 'eager':
+                    model = ml.build_eager(name).cpu().eval()
+                elif os.path.exists(backends.exported_path(name, backend)):
+                    model = backends.load_exported(name, backend, 'cpu')
+                else:
+                    self.stdout.write(f"{name:<11}{backend:<13}  not exported, skipped")
+                    continue
+
+                for batch_size in options['batch_sizes']:
+                    timings = time_model(model, backends.example_inputs(name, batch_size), options['iterations'], options['warmup'])
+                    p50 = timings[len(timings) // 2]
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    throughput = batch_size / (sum(timings) / len(timings) / 1000)
+                    self.stdout.write(f"{name:<11}{backend:<13}{batch_size:>6}{p50:>10.2f}{p95:>10.2f}{throughput:>10.1f}")
+
+
+def time_model(model, inputs, iterations, warmup):
+    """Sorted per-call latencies in milliseconds."""
+    timings = []
+    with torch.no_grad():
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            model(*inputs)
+            if i >= warmup:
+                timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
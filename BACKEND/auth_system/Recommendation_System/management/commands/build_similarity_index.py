@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Recommendation_System.models import UploadedImage
+from Recommendation_System.similarity import SimilarityIndex, embedding_from_bytes
+
+
+class Command(BaseCommand):
+    help = "Rebuild the upload similarity index from stored embeddings and write the snapshot that workers memory-map."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=0, help="Number of IVF partitions (0 = brute force only).")
+        parser.add_argument('--output', default=settings.RECOMMENDATION_SIMILARITY_INDEX_DIR)
+
+    def handle(self, *args, **options):
+        index = SimilarityIndex()
+        rows = UploadedImage.objects.filter(embedding__isnull=False).order_by('id').values_list('id', 'embedding')
+        for image_id, embedding in rows.iterator():
+            index.add(image_id, embedding_from_bytes(embedding))
+
+        if options['partitions'] and len(index):
+            index.build_partitions(options['partitions'])
+        index.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(index)} vectors to {options['output']}"))
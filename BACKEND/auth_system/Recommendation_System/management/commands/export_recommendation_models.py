@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Recommendation_System import backends, ml
+
+MODEL_NAMES = ('classifier', 'generator')
+
+
+class Command(BaseCommand):
+    help = "Export the recommendation classifier and generator to TorchScript and/or ONNX and check parity with eager mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['torchscript', 'onnx', 'all'], default='all')
+        parser.add_argument('--atol', type=float, default=1e-4, help="Max absolute difference allowed against eager outputs.")
+        parser.add_argument('--skip-check', action='store_true', help="Export without the parity check.")
+
+    def handle(self, *args, **options):
+        formats = ['torchscript', 'onnx'] if options['format'] == 'all' else [options['format']]
+        os.makedirs(os.path.dirname(backends.exported_path('classifier', 'torchscript')), exist_ok=True)
+
+        for name in MODEL_NAMES:
+            model = ml.build_eager(name).cpu().eval()
+            for backend in formats:
+                path = backends.exported_path(name, backend)
+                if backend == 'torchscript':
+                    backends.export_torchscript(model, name, path)
+                else:
+                    backends.export_onnx(model, name, path)
+                self.stdout.write(f"Exported {name} ({backend}) to {path}")
+
+                if not options['skip_check']:
+                    diff = backends.check_parity(model, backends.load_exported(name, backend, 'cpu'), name)
+                    if diff > options['atol']:
+                        raise CommandError(f"{name} ({backend}) differs from eager by {diff:.2e} (atol {options['atol']:.0e})")
+                    self.stdout.write(self.style.SUCCESS(f"  parity ok, max abs diff {diff:.2e}"))
+
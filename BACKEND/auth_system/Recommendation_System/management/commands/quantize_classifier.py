@@ -0,0 +1,68 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Recommendation_System import ml, quantization
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the int8 clothing classifier used when RECOMMENDATION_CLASSIFIER_PRECISION='int8', "
+        "and fail if its top-1 agreement with the float model is below the threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['static', 'dynamic'], default='static')
+        parser.add_argument(
+            '--calibration-dir', default=settings.RECOMMENDATION_CALIBRATION_DIR,
+            help="A fixed image set (defaults to RECOMMENDATION_CALIBRATION_DIR, which must be set explicitly).",
+        )
+        parser.add_argument('--eval-dir', help="Images for the agreement check (defaults to the calibration set).")
+        parser.add_argument('--limit', type=int, default=64, help="Max images read from each directory.")
+        parser.add_argument('--min-agreement', type=float, default=settings.RECOMMENDATION_INT8_MIN_AGREEMENT)
+        parser.add_argument('--check-only', action='store_true', help="Only re-check the existing int8 model.")
+
+    def handle(self, *args, **options):
+        if not options['calibration_dir']:
+            raise CommandError(
+                "No calibration set: pass --calibration-dir or set RECOMMENDATION_CALIBRATION_DIR "
+                "to a fixed image directory (live uploads would make the agreement check unreproducible)."
+            )
+        media_uploads = os.path.realpath(os.path.join(settings.MEDIA_ROOT, 'uploads'))
+        for directory in (options['calibration_dir'], options['eval_dir']):
+            if directory and os.path.realpath(directory) == media_uploads:
+                raise CommandError(f"{directory} holds live user uploads; use a fixed image set instead.")
+
+        calibration = quantization.calibration_images(options['calibration_dir'], options['limit'])
+        if not calibration:
+            raise CommandError(f"No calibration images found in {options['calibration_dir']}")
+        evaluation = calibration
+        if options['eval_dir']:
+            evaluation = quantization.calibration_images(options['eval_dir'], options['limit'])
+
+        float_model = ml.build_eager('classifier').cpu().eval()
+        path = quantization.quantized_classifier_path()
+
+        if options['check_only']:
+            if not os.path.exists(path):
+                raise CommandError(f"No int8 classifier at {path}")
+            quantized_model = quantization.load_quantized(enforce_gate=False)
+        else:
+            if options['mode'] == 'static':
+                state_dict_path = os.path.join(settings.BASE_DIR, settings.RECOMMENDATION_CLASSIFIER_PATH)
+                quantized_model = quantization.quantize_static(state_dict_path, calibration)
+            else:
+                quantized_model = quantization.quantize_dynamic(ml.build_eager('classifier').eval())
+
+        agreement = quantization.top1_agreement(float_model, quantized_model, evaluation)
+        self.stdout.write(f"Top-1 agreement with float model: {agreement:.3f} over {len(evaluation)} images")
+        try:
+            quantization.check_agreement(agreement, options['min_agreement'])
+        except quantization.AgreementGateError as e:
+            raise CommandError(str(e))
+
+        if not options['check_only']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            quantization.save_quantized(quantized_model, path, agreement, len(evaluation))
+            self.stdout.write(self.style.SUCCESS(f"Saved {options['mode']} int8 classifier to {path}"))
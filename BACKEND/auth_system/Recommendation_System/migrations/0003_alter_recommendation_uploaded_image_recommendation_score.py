@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Recommendation_System", "0002_uploadedimage_content_hash_classificationresult"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="recommendation",
+            name="uploaded_image",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="recommendations",
+                to="Recommendation_System.uploadedimage",
+            ),
+        ),
+        migrations.AddField(
+            model_name="recommendation",
+            name="score",
+            field=models.FloatField(null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Recommendation_System", "0003_alter_recommendation_uploaded_image_recommendation_score"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadedimage",
+            name="embedding",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="classificationresult",
+            name="embedding",
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,233 @@
+import os
+import threading
+from io import BytesIO
+
+import torch
+from torch import nn
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from torchvision import models
+from PIL import Image, ImageEnhance
+import numpy as np
+from .backends import load_exported
+
+CLASS_LABELS = ['Full dress', 'Lower wear', 'Upper wear']
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Classifier loading
+def load_classifier(model_path):
+    model = models.resnet18(pretrained=False)
+    model.fc = nn.Linear(model.fc.in_features, 3)
+    model.load_state_dict(torch.load(model_path, map_location=device))
+    model.eval()
+    return model
+
+# Generator model
+class Generator(nn.Module):
+    def __init__(self, z_dim=100, num_classes=3, channels=3, hidden_dim=64):
+        super(Generator, self).__init__()
+        self.input_dim = z_dim + num_classes
+
+        self.input_layer = nn.Sequential(
+            nn.Linear(self.input_dim, hidden_dim * 16 * 4 * 4),
+            nn.BatchNorm1d(hidden_dim * 16 * 4 * 4),
+            nn.ReLU(inplace=True)
+        )
+
+        self.gen = nn.Sequential(
+            nn.ConvTranspose2d(hidden_dim * 16, hidden_dim * 8, 4, 2, 1),
+            nn.BatchNorm2d(hidden_dim * 8),
+            nn.ReLU(inplace=True),
+            nn.ConvTranspose2d(hidden_dim * 8, hidden_dim * 4, 4, 2, 1),
+            nn.BatchNorm2d(hidden_dim * 4),
+            nn.ReLU(inplace=True),
+            nn.ConvTranspose2d(hidden_dim * 4, hidden_dim * 2, 4, 2, 1),
+            nn.BatchNorm2d(hidden_dim * 2),
+            nn.ReLU(inplace=True),
+            nn.ConvTranspose2d(hidden_dim * 2, hidden_dim, 4, 2, 1),
+            nn.BatchNorm2d(hidden_dim),
+            nn.ReLU(inplace=True),
+            nn.ConvTranspose2d(hidden_dim, channels, 4, 2, 1),
+            nn.Tanh()
+        )
+
+    def forward(self, noise, labels):
+        x = torch.cat([noise, labels], dim=1)
+        x = self.input_layer(x)
+        x = x.view(-1, 64*16, 4, 4)
+        return self.gen(x)
+
+def load_generator(model_path):
+    generator = Generator(z_dim=100, num_classes=3, channels=3, hidden_dim=64).to(device)
+    checkpoint = torch.load(model_path, map_location=device)
+    generator.load_state_dict(checkpoint['generator_state_dict'])
+    generator.eval()
+    return generator
+
+def build_eager(name):
+    if name == 'classifier':
+        return load_classifier(os.path.join(settings.BASE_DIR, settings.RECOMMENDATION_CLASSIFIER_PATH)).to(device)
+    return load_generator(os.path.join(settings.BASE_DIR, settings.RECOMMENDATION_GENERATOR_PATH))
+
+# Registry loaders, see registry.py. RECOMMENDATION_INFERENCE_BACKEND picks eager
+# PyTorch or a graph exported by `manage.py export_recommendation_models`.
+def build_classifier():
+    if settings.RECOMMENDATION_CLASSIFIER_PRECISION == 'int8':
+        # Built by `manage.py quantize_classifier`; quantized kernels are CPU-only
+        if device.type != 'cpu':
+            raise ImproperlyConfigured("The int8 classifier only runs on CPU.")
+        from .quantization import load_quantized
+        return load_quantized()
+    backend = settings.RECOMMENDATION_INFERENCE_BACKEND
+    if backend == 'eager':
+        return build_eager('classifier')
+    return load_exported('classifier', backend, device)
+
+def build_generator():
+    backend = settings.RECOMMENDATION_INFERENCE_BACKEND
+    if backend == 'eager':
+        return build_eager('generator')
+    return load_exported('generator', backend, device)
+
+# Image processing functions
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+_scratch = threading.local()
+
+def load_classifier_input(image_path, size):
+    """
+    Decode straight to roughly `size` pixels: JPEG draft mode lets libjpeg scale by
+    1/2, 1/4 or 1/8 while decoding, other formats are box-reduced before the resize.
+    """
+    img = Image.open(image_path)
+    img.draft('RGB', (size, size))
+    img = img.convert("RGB")
+    factor = min(img.width, img.height) // size
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img.resize((size, size), Image.BILINEAR)
+
+def preprocess_image(image_path, size=None):
+    """
+    `image_path` may be a path or a binary file-like object such as an upload buffer.
+    Returns a normalized (1, 3, size, size) tensor; the float scratch buffer is reused per thread.
+    """
+    size = size or settings.RECOMMENDATION_CLASSIFIER_INPUT_SIZE
+    img = load_classifier_input(image_path, size)
+
+    scratch = getattr(_scratch, 'buffer', None)
+    if scratch is None or scratch.shape != (size, size, 3):
+        scratch = _scratch.buffer = np.empty((size, size, 3), dtype=np.float32)
+    np.multiply(np.asarray(img), 1 / 255, out=scratch, casting='unsafe')
+    scratch -= IMAGENET_MEAN
+    scratch /= IMAGENET_STD
+
+    img_tensor = torch.empty((1, 3, size, size), dtype=torch.float32)
+    img_tensor[0].copy_(torch.from_numpy(scratch).permute(2, 0, 1))
+    return img_tensor
+
+def classify_image(model, img_tensor, class_labels):
+    with torch.no_grad():
+        outputs = model(img_tensor)
+    probs = torch.nn.functional.softmax(outputs, dim=1)
+    return class_labels[torch.argmax(probs)], probs.squeeze().tolist()
+
+def forward_with_embeddings(model, batch):
+    """
+    Logits plus the 512-d penultimate ResNet18 features. Only the eager float model
+    exposes its layers; exported and quantized backends return None for the features.
+    """
+    if type(model) is not models.ResNet:
+        return model(batch), None
+    x = model.maxpool(model.relu(model.bn1(model.conv1(batch))))
+    x = model.layer4(model.layer3(model.layer2(model.layer1(x))))
+    features = torch.flatten(model.avgpool(x), 1)
+    return model.fc(features), features
+
+def classify_batch(model, img_tensors, class_labels):
+    """
+    Classify a list of (1, C, H, W) tensors, running one forward pass per
+    distinct input size. Returns a (label, probs, embedding) tuple per input, in
+    order; embedding is a float16 array, or None if the backend can't provide it.
+    """
+    results = [None] * len(img_tensors)
+    by_shape = {}
+    for i, img_tensor in enumerate(img_tensors):
+        by_shape.setdefault(tuple(img_tensor.shape[1:]), []).append(i)
+
+    for indices in by_shape.values():
+        batch = torch.cat([img_tensors[i] for i in indices]).to(device)
+        with torch.no_grad():
+            logits, features = forward_with_embeddings(model, batch)
+            probs = torch.nn.functional.softmax(logits, dim=1).cpu()
+        embeddings = features.cpu().numpy().astype(np.float16) if features is not None else [None] * len(indices)
+        for i, row, embedding in zip(indices, probs, embeddings):
+            results[i] = (class_labels[int(torch.argmax(row))], row.tolist(), embedding)
+    return results
+
+def enhance_pil(image_pil):
+    enhancer = ImageEnhance.Sharpness(image_pil)
+    image_pil = enhancer.enhance(1.5)
+    enhancer = ImageEnhance.Contrast(image_pil)
+    image_pil = enhancer.enhance(1.0)
+    enhancer = ImageEnhance.Brightness(image_pil)
+    image_pil = enhancer.enhance(0.8)
+    return image_pil
+
+COMPLEMENTARY_CLASS = {
+    'Full dress': 'Full dress',
+    'Lower wear': 'Upper wear',
+    'Upper wear': 'Lower wear'
+}
+
+def complementary_class(predicted_class):
+    return COMPLEMENTARY_CLASS.get(predicted_class, 'Full dress')
+
+def generate_complementary(generator, predicted_class, class_labels, device):
+    return generate_batch(generator, complementary_class(predicted_class), class_labels, 1)[0]
+
+def generate_batch(generator, target_class, class_labels, count):
+    """Generate `count` images of `target_class` in one forward pass, as HxWx3 arrays in [0, 1]."""
+    target_idx = class_labels.index(target_class)
+    label = torch.zeros(count, len(class_labels), device=device)
+    label[:, target_idx] = 1
+    noise = torch.randn(count, 100, device=device)
+    with torch.no_grad():
+        generated = generator(noise, label)
+    return list((generated.permute(0, 2, 3, 1).cpu().numpy() + 1) / 2)
+
+def generate_ranked(generator, classifier, target_class, class_labels, count):
+    """
+    Generate `count` candidates of `target_class` in one forward pass and score each
+    by the classifier's confidence that it is `target_class`, also in one pass.
+    Candidates are scored at the classifier input size real uploads are classified at.
+    Returns (image, score) pairs, best first.
+    """
+    target_idx = class_labels.index(target_class)
+    label = torch.zeros(count, len(class_labels), device=device)
+    label[:, target_idx] = 1
+    noise = torch.randn(count, 100, device=device)
+    mean = torch.tensor([0.485, 0.456, 0.406], device=device).view(1, 3, 1, 1)
+    std = torch.tensor([0.229, 0.224, 0.225], device=device).view(1, 3, 1, 1)
+    size = settings.RECOMMENDATION_CLASSIFIER_INPUT_SIZE
+    with torch.no_grad():
+        generated = (generator(noise, label) + 1) / 2
+        resized = torch.nn.functional.interpolate(generated, size=(size, size), mode='bilinear', align_corners=False)
+        probs = torch.nn.functional.softmax(classifier((resized - mean) / std), dim=1)
+    images = generated.permute(0, 2, 3, 1).cpu().numpy()
+    scores = probs[:, target_idx].cpu().tolist()
+    return sorted(zip(images, scores), key=lambda candidate: candidate[1], reverse=True)
+
+def render_generated(generated_image):
+    """Turn a generator output into the enhanced 128x128 PIL image we serve."""
+    generated_image = (generated_image * 255).astype(np.uint8)
+    pil_image = Image.fromarray(generated_image)
+    pil_image = pil_image.resize((128, 128))  # Resize to 128x128
+    return enhance_pil(pil_image)  # Apply enhancements
+
+def encode_jpeg(pil_image):
+    buffer = BytesIO()
+    pil_image.save(buffer, format='JPEG')
+    return buffer.getvalue()
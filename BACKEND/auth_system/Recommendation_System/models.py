@@ -6,14 +6,28 @@ class UploadedImage(models.Model):
     image = models.ImageField(upload_to='uploads/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     class_label = models.CharField(max_length=20, null=True)
+    content_hash = models.CharField(max_length=64, null=True, db_index=True)  # SHA-256 of the image bytes
+    embedding = models.BinaryField(null=True)  # float16 penultimate classifier features, see similarity.py
     
     def __str__(self):
         return f"{self.user.email if self.user else 'Anonymous'}'s image"
 
 class Recommendation(models.Model):
-    uploaded_image = models.OneToOneField(UploadedImage, on_delete=models.CASCADE, related_name='recommendation')
+    uploaded_image = models.ForeignKey(UploadedImage, on_delete=models.CASCADE, related_name='recommendations')
     generated_image = models.URLField()  # URL to generated image
+    score = models.FloatField(null=True)  # Classifier confidence for the target class, when ranked
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Recommendation for {self.uploaded_image}"
+
+class ClassificationResult(models.Model):
+    """Classifier output for an image, shared by every upload with the same bytes."""
+    content_hash = models.CharField(max_length=64, unique=True)
+    class_label = models.CharField(max_length=20)
+    probabilities = models.JSONField()
+    embedding = models.BinaryField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]}: {self.class_label}"
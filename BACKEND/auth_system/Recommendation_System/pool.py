@@ -0,0 +1,97 @@
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ComplementaryPool:
+    """
+    Per-class pool of ready-to-serve complementary images (enhanced, JPEG encoded).
+    A background thread refills a class in one batched generator pass whenever
+    it drops below `low_watermark`.
+    """
+
+    def __init__(self, capacity=32, low_watermark=8):
+        self.capacity = capacity
+        self.low_watermark = min(low_watermark, capacity)
+        self._items = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._refiller = None
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+
+    def pop(self, target_class):
+        """Take one encoded JPEG for `target_class`, or None if the pool is empty."""
+        self._ensure_refiller()
+        with self._lock:
+            items = self._items.setdefault(target_class, deque())
+            item = items.popleft() if items else None
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if len(items) < self.low_watermark:
+                self._wakeup.set()
+        return item
+
+    def fill(self, target_class):
+        from . import ml
+        from .registry import registry
+
+        with self._lock:
+            missing = self.capacity - len(self._items.setdefault(target_class, deque()))
+        if missing <= 0:
+            return 0
+
+        generated = ml.generate_batch(registry.get('generator'), target_class, ml.CLASS_LABELS, missing)
+        encoded = [ml.encode_jpeg(ml.render_generated(image)) for image in generated]
+        with self._lock:
+            items = self._items[target_class]
+            items.extend(encoded[:self.capacity - len(items)])
+            self.refills += 1
+        return len(encoded)
+
+    def _ensure_refiller(self):
+        if self._refiller is not None and self._refiller.is_alive():
+            return
+        with self._lock:
+            if self._refiller is None or not self._refiller.is_alive():
+                self._refiller = threading.Thread(target=self._refill_loop, name="complementary-pool", daemon=True)
+                self._refiller.start()
+
+    def _refill_loop(self):
+        from . import ml
+
+        while True:
+            for target_class in set(ml.COMPLEMENTARY_CLASS.values()):
+                with self._lock:
+                    level = len(self._items.get(target_class, ()))
+                if level < self.low_watermark:
+                    try:
+                        self.fill(target_class)
+                    except Exception as e:
+                        logger.error(f"Failed to refill complementary pool for '{target_class}': {str(e)}")
+            self._wakeup.wait(timeout=30)
+            self._wakeup.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "lowWatermark": self.low_watermark,
+                "levels": {target_class: len(items) for target_class, items in self._items.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "refills": self.refills,
+            }
+
+
+complementary_pool = ComplementaryPool(
+    capacity=settings.RECOMMENDATION_POOL_SIZE,
+    low_watermark=settings.RECOMMENDATION_POOL_LOW_WATERMARK,
+)
@@ -0,0 +1,101 @@
+import glob
+import json
+import os
+
+import torch
+from torch import nn
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from torchvision.models import quantization as quantized_models
+
+from . import ml
+
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png')
+
+
+def quantized_classifier_path():
+    return os.path.join(settings.RECOMMENDATION_EXPORT_DIR, 'classifier_int8.pt')
+
+
+def calibration_images(directory, limit):
+    paths = []
+    for extension in IMAGE_EXTENSIONS:
+        paths.extend(glob.glob(os.path.join(directory, f"*.{extension}")))
+    return [ml.preprocess_image(path) for path in sorted(paths)[:limit]]
+
+
+def quantize_static(state_dict_path, calibration_tensors):
+    """
+    Post-training static int8 quantization: fuse conv/bn/relu, observe activation
+    ranges on the calibration images, then convert every layer to int8.
+    """
+    torch.backends.quantized.engine = 'fbgemm'
+    model = quantized_models.resnet18(weights=None, quantize=False)
+    model.fc = nn.Linear(model.fc.in_features, 3)
+    model.load_state_dict(torch.load(state_dict_path, map_location='cpu'))
+    model.eval()
+    model.fuse_model()
+    model.qconfig = torch.ao.quantization.get_default_qconfig('fbgemm')
+    torch.ao.quantization.prepare(model, inplace=True)
+    with torch.no_grad():
+        for img_tensor in calibration_tensors:
+            model(img_tensor)
+    return torch.ao.quantization.convert(model, inplace=True)
+
+
+def quantize_dynamic(float_model):
+    """Dynamic int8 quantization; only the Linear head is quantized for ResNet18."""
+    return torch.ao.quantization.quantize_dynamic(float_model.cpu(), {nn.Linear}, dtype=torch.qint8)
+
+
+METADATA_FILE = 'quantization.json'
+
+
+class AgreementGateError(Exception):
+    pass
+
+
+def check_agreement(agreement, min_agreement):
+    """The build gate: raise unless the int8 model agrees with the float one often enough."""
+    if agreement is None or agreement < min_agreement:
+        measured = 'unmeasured' if agreement is None else f"{agreement:.3f}"
+        raise AgreementGateError(f"Top-1 agreement {measured} is below the required {min_agreement:.3f}")
+
+
+def save_quantized(model, path, agreement, images):
+    """Save the int8 graph with the agreement it was measured at, so loading can re-apply the gate."""
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(model, torch.randn(1, 3, 224, 224)).eval())
+    metadata = {"agreement": agreement, "images": images}
+    scripted.save(path, _extra_files={METADATA_FILE: json.dumps(metadata)})
+
+
+def load_quantized(enforce_gate=True):
+    """
+    Load the int8 classifier. Artifacts without a recorded agreement, or one below
+    RECOMMENDATION_INT8_MIN_AGREEMENT, are refused.
+    """
+    torch.backends.quantized.engine = 'fbgemm'
+    extra_files = {METADATA_FILE: ''}
+    model = torch.jit.load(quantized_classifier_path(), map_location='cpu', _extra_files=extra_files)
+    if enforce_gate:
+        metadata = json.loads(extra_files[METADATA_FILE] or '{}')
+        try:
+            check_agreement(metadata.get('agreement'), settings.RECOMMENDATION_INT8_MIN_AGREEMENT)
+        except AgreementGateError as e:
+            raise ImproperlyConfigured(
+                f"Refusing the int8 classifier at {quantized_classifier_path()}: {str(e)}. "
+                "Rebuild it with `manage.py quantize_classifier`."
+            )
+    return model
+
+
+def top1_agreement(float_model, quantized_model, img_tensors):
+    """Fraction of images on which both models predict the same class."""
+    agree = 0
+    with torch.no_grad():
+        for img_tensor in img_tensors:
+            expected = float_model(img_tensor).argmax(dim=1)
+            actual = quantized_model(img_tensor).argmax(dim=1)
+            agree += int((expected == actual).all())
+    return agree / len(img_tensors)
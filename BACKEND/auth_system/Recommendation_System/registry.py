@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of ML models that are loaded on first use.
+    Loaders are dotted import paths so registering a model never imports torch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaders = {}
+        self._load_locks = {}
+        self._models = {}
+        self._load_times = {}
+        self._loaded_at = {}
+        self._errors = {}
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks[name] = threading.Lock()
+            self._models.pop(name, None)
+            self._load_times.pop(name, None)
+            self._loaded_at.pop(name, None)
+            self._errors.pop(name, None)
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under '{name}'")
+
+        # Only one thread loads a given model; the others wait and reuse it.
+        with self._load_locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            loader = self._loaders[name]
+            if isinstance(loader, str):
+                loader = import_string(loader)
+
+            start = time.perf_counter()
+            try:
+                model = loader()
+            except Exception as e:
+                self._errors[name] = str(e)
+                logger.error(f"Failed to load model '{name}': {str(e)}")
+                raise
+            self._load_times[name] = time.perf_counter() - start
+            self._loaded_at[name] = time.time()
+            self._errors.pop(name, None)
+            self._models[name] = model
+            logger.info(f"Loaded model '{name}' in {self._load_times[name]:.2f}s")
+        return model
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def unload(self, name):
+        with self._load_locks[name]:
+            self._models.pop(name, None)
+            self._load_times.pop(name, None)
+            self._loaded_at.pop(name, None)
+
+    def status(self):
+        return {
+            name: {
+                "loaded": name in self._models,
+                "loadTimeMs": round(self._load_times[name] * 1000, 1) if name in self._load_times else None,
+                "loadedAt": self._loaded_at.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in self._loaders
+        }
+
+
+registry = ModelRegistry()
+registry.register('classifier', 'Recommendation_System.ml.build_classifier')
+registry.register('generator', 'Recommendation_System.ml.build_generator')
@@ -10,4 +10,4 @@ class UploadedImageSerializer(serializers.ModelSerializer):
 class RecommendationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recommendation
-        fields = ['id', 'generated_image', 'created_at']
\ No newline at end of file
+        fields = ['id', 'generated_image', 'score', 'created_at']
\ No newline at end of file
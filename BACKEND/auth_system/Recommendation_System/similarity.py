@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 512
+
+
+def embedding_from_bytes(data):
+    return np.frombuffer(data, dtype=np.float16)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class SimilarityIndex:
+    """
+    Cosine-similarity nearest-neighbour index over float16 upload embeddings.
+
+    Search is a vectorized brute-force matrix product. With `partitions` set, a
+    k-means (IVF) layout is built and a query only scans the `nprobe` closest
+    partitions. Snapshots are plain .npy files that are memory-mapped on load;
+    vectors added afterwards go to an in-memory tail until the next snapshot.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, dim), dtype=np.float16)
+        self._tail_ids = []
+        self._tail_vectors = []
+        self._centroids = None
+        self._assignments = None
+
+    def __len__(self):
+        return len(self._ids) + len(self._tail_ids)
+
+    @property
+    def max_id(self):
+        ids = [int(self._ids.max())] if len(self._ids) else []
+        return max(ids + self._tail_ids, default=0)
+
+    def add(self, image_id, embedding):
+        vector = _normalize(embedding).astype(np.float16)
+        with self._lock:
+            self._tail_ids.append(int(image_id))
+            self._tail_vectors.append(vector)
+
+    def missing(self, image_ids):
+        """The subset of `image_ids` that isn't in the index yet."""
+        with self._lock:
+            known = np.concatenate([self._ids, np.array(self._tail_ids, dtype=np.int64)])
+        image_ids = np.asarray(image_ids, dtype=np.int64)
+        return image_ids[~np.isin(image_ids, known)].tolist()
+
+    def _merged(self):
+        """Snapshot rows plus the tail, without copying the memory-mapped part when the tail is empty."""
+        with self._lock:
+            if not self._tail_ids:
+                return self._ids, self._vectors, 0
+            tail_ids = np.array(self._tail_ids, dtype=np.int64)
+            tail_vectors = np.stack(self._tail_vectors)
+        return np.concatenate([self._ids, tail_ids]), np.concatenate([self._vectors, tail_vectors]), len(tail_ids)
+
+    def search(self, embedding, k=10, exclude_id=None, nprobe=None, allowed_ids=None):
+        """Top-`k` (id, score) pairs, best first; `allowed_ids` restricts which rows may match."""
+        query = _normalize(embedding)
+        ids, vectors, tail_count = self._merged()
+        if not len(ids):
+            return []
+
+        if self._centroids is not None:
+            nprobe = nprobe or settings.RECOMMENDATION_SIMILARITY_NPROBE
+            nearest = np.argsort(-(self._centroids @ query))[:nprobe]
+            in_partitions = np.flatnonzero(np.isin(self._assignments, nearest))
+            # Tail rows aren't assigned to partitions yet, so they are always scanned
+            tail_rows = np.arange(len(ids) - tail_count, len(ids))
+            candidates = np.concatenate([in_partitions, tail_rows])
+            ids, vectors = ids[candidates], vectors[candidates]
+
+        scores = vectors.astype(np.float32) @ query
+        if exclude_id is not None:
+            scores[ids == exclude_id] = -np.inf
+        if allowed_ids is not None:
+            scores[~np.isin(ids, np.asarray(allowed_ids, dtype=np.int64))] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def build_partitions(self, partitions, iterations=10, seed=0):
+        """Cluster every vector (snapshot and tail) into `partitions` k-means cells."""
+        ids, vectors, _ = self._merged()
+        vectors = vectors.astype(np.float32)
+        partitions = min(partitions, len(ids))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), partitions, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for p in range(partitions):
+                members = vectors[assignments == p]
+                if len(members):
+                    centroids[p] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        with self._lock:
+            self._ids, self._vectors = ids, vectors.astype(np.float16)
+            self._tail_ids, self._tail_vectors = [], []
+            self._centroids = centroids
+            self._assignments = np.argmax(vectors @ centroids.T, axis=1)
+
+    def save(self, directory):
+        ids, vectors, tail_count = self._merged()
+        arrays = {'ids': ids, 'vectors': vectors}
+        if self._centroids is not None:
+            assignments = self._assignments
+            if tail_count:
+                tail = vectors[-tail_count:].astype(np.float32)
+                assignments = np.concatenate([assignments, np.argmax(tail @ self._centroids.T, axis=1)])
+            arrays.update(centroids=self._centroids, assignments=assignments)
+
+        os.makedirs(directory, exist_ok=True)
+        for name in ('centroids', 'assignments'):
+            if name not in arrays and os.path.exists(os.path.join(directory, f'{name}.npy')):
+                os.remove(os.path.join(directory, f'{name}.npy'))
+        for name, value in arrays.items():
+            # Write beside and rename, so a process that has the old file mapped keeps a valid mapping
+            tmp_path = os.path.join(directory, f'{name}.tmp.npy')
+            np.save(tmp_path, value)
+            os.replace(tmp_path, os.path.join(directory, f'{name}.npy'))
+
+    @classmethod
+    def load(cls, directory):
+        index = cls()
+        index._ids = np.load(os.path.join(directory, 'ids.npy'))
+        index._vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r')
+        index.dim = index._vectors.shape[1]
+        centroids_path = os.path.join(directory, 'centroids.npy')
+        assignments_path = os.path.join(directory, 'assignments.npy')
+        if os.path.exists(centroids_path) and os.path.exists(assignments_path):
+            index._centroids = np.load(centroids_path)
+            index._assignments = np.load(assignments_path)
+        return index
+
+    def stats(self):
+        with self._lock:
+            return {
+                "vectors": len(self._ids) + len(self._tail_ids),
+                "unsnapshotted": len(self._tail_ids),
+                "partitions": len(self._centroids) if self._centroids is not None else 0,
+                "memoryMapped": isinstance(self._vectors, np.memmap),
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """
+    The process-wide index: the memory-mapped snapshot (if any) plus every
+    embedded upload saved since it was taken.
+
+    Each server process holds its own copy, and uploads embedded by another
+    process aren't added to it. Callers that need them pull the rows they are
+    about to search over in with `sync_rows` first.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _load_index()
+    return _index
+
+
+def _load_index():
+    from .models import UploadedImage
+
+    directory = settings.RECOMMENDATION_SIMILARITY_INDEX_DIR
+    if os.path.exists(os.path.join(directory, 'ids.npy')):
+        index = SimilarityIndex.load(directory)
+    else:
+        index = SimilarityIndex()
+
+    rows = UploadedImage.objects.filter(id__gt=index.max_id, embedding__isnull=False).values_list('id', 'embedding')
+    for image_id, embedding in rows.iterator():
+        index.add(image_id, embedding_from_bytes(embedding))
+    logger.info(f"Similarity index ready with {len(index)} vectors")
+    return index
+
+
+def sync_rows(index, queryset):
+    """
+    Add the embedded rows of `queryset` that `index` doesn't hold yet, such as
+    uploads embedded by another server process or legacy rows embedded lazily.
+    Returns the ids of every embedded row in `queryset`.
+    """
+    image_ids = list(queryset.filter(embedding__isnull=False).values_list('id', flat=True))
+    missing = index.missing(image_ids)
+    if missing:
+        rows = queryset.filter(id__in=missing).values_list('id', 'embedding')
+        for image_id, embedding in rows.iterator():
+            index.add(image_id, embedding_from_bytes(embedding))
+    return image_ids
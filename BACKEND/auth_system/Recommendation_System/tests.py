@@ -1,3 +1,99 @@
-from django.test import TestCase
+import importlib.util
+import os
+import tempfile
 
-# Create your tests here.
+import torch
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from torch import nn
+from torchvision import models
+
+from . import backends, ml, quantization
+
+PARITY_ATOL = 1e-4
+
+
+def random_models():
+    """Randomly initialised classifier and generator with the served architectures."""
+    torch.manual_seed(0)
+    classifier = models.resnet18(weights=None)
+    classifier.fc = nn.Linear(classifier.fc.in_features, 3)
+    generator = ml.Generator(z_dim=100, num_classes=3, channels=3, hidden_dim=64)
+    return {'classifier': classifier.eval(), 'generator': generator.cpu().eval()}
+
+
+class ExportParityTests(SimpleTestCase):
+    """Exported graphs must match eager outputs; no checkpoints are needed."""
+
+    def setUp(self):
+        self.models = random_models()
+        self.export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.export_dir.cleanup)
+
+    def path(self, name, backend):
+        return os.path.join(self.export_dir.name, f"{name}.{backends.EXTENSIONS[backend]}")
+
+    def test_torchscript_matches_eager(self):
+        for name, model in self.models.items():
+            with self.subTest(model=name):
+                path = self.path(name, 'torchscript')
+                backends.export_torchscript(model, name, path)
+                exported = torch.jit.load(path, map_location='cpu')
+                self.assertLessEqual(backends.check_parity(model, exported, name), PARITY_ATOL)
+
+    def test_onnx_matches_eager(self):
+        if importlib.util.find_spec('onnxruntime') is None:
+            self.skipTest("onnxruntime is not installed")
+        for name, model in self.models.items():
+            with self.subTest(model=name):
+                path = self.path(name, 'onnx')
+                backends.export_onnx(model, name, path)
+                exported = backends.OnnxModel(path, 'cpu')
+                self.assertLessEqual(backends.check_parity(model, exported, name), PARITY_ATOL)
+
+
+class FixedLogits(nn.Module):
+    """Stands in for a classifier: returns the next row of `logits` for each input."""
+
+    def __init__(self, logits):
+        super().__init__()
+        self.logits = iter(torch.tensor(logits, dtype=torch.float32))
+
+    def forward(self, img_tensor):
+        return next(self.logits).unsqueeze(0)
+
+
+class TinyClassifier(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.fc = nn.Linear(3, 3)
+
+    def forward(self, img_tensor):
+        return self.fc(img_tensor.mean(dim=(2, 3)))
+
+
+class Int8AgreementGateTests(SimpleTestCase):
+    def test_gate_rejects_low_agreement(self):
+        float_model = FixedLogits([[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 0, 0]])
+        quantized_model = FixedLogits([[1, 0, 0], [0, 1, 0], [0, 0, 1], [0, 1, 0]])
+        images = [torch.zeros(1, 3, 8, 8)] * 4
+
+        agreement = quantization.top1_agreement(float_model, quantized_model, images)
+        self.assertEqual(agreement, 0.75)
+        with self.assertRaisesMessage(quantization.AgreementGateError, "0.750 is below the required 0.970"):
+            quantization.check_agreement(agreement, 0.97)
+        quantization.check_agreement(0.98, 0.97)
+
+    def test_load_refuses_artifacts_below_the_gate(self):
+        if 'fbgemm' not in torch.backends.quantized.supported_engines:
+            self.skipTest("fbgemm quantized engine is not available")
+        with tempfile.TemporaryDirectory() as export_dir, \
+                override_settings(RECOMMENDATION_EXPORT_DIR=export_dir, RECOMMENDATION_INT8_MIN_AGREEMENT=0.97):
+            path = quantization.quantized_classifier_path()
+            quantization.save_quantized(TinyClassifier().eval(), path, agreement=0.75, images=4)
+            with self.assertRaises(ImproperlyConfigured):
+                quantization.load_quantized()
+            quantization.load_quantized(enforce_gate=False)
+
+            quantization.save_quantized(TinyClassifier().eval(), path, agreement=0.99, images=4)
+            quantization.load_quantized()
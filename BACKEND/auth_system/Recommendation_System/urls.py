@@ -1,8 +1,10 @@
 # recommendation/urls.py
 from django.urls import path
-from .views import ImageUploadView, RecommendationView
+from .views import ImageUploadView, RecommendationView, SimilarImagesView, ModelStatusView
 
 urlpatterns = [
     path('upload/', ImageUploadView.as_view(), name='image-upload'),
     path('recommend/', RecommendationView.as_view(), name='get-recommendation'),
+    path('similar/<int:image_id>/', SimilarImagesView.as_view(), name='similar-images'),
+    path('models/status/', ModelStatusView.as_view(), name='model-status'),
 ]
\ No newline at end of file
@@ -0,0 +1,30 @@
+import logging
+import threading
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+class FileWriteThread(threading.Thread):
+    """
+    Writes bytes to default_storage after the response has been sent. `on_failure`
+    runs if the write fails, so callers can drop the row that points at the file.
+    Not a daemon thread: interpreter shutdown waits for the write to finish.
+    """
+
+    def __init__(self, storage_name, data, on_failure=None):
+        super().__init__()
+        self.storage_name = storage_name
+        self.data = data
+        self.on_failure = on_failure
+
+    def run(self):
+        try:
+            default_storage.save(self.storage_name, ContentFile(self.data))
+        except Exception as e:
+            logger.error(f"Failed to write {self.storage_name}: {str(e)}")
+            if self.on_failure is not None:
+                try:
+                    self.on_failure()
+                except Exception as e:
+                    logger.error(f"Cleanup after failed write of {self.storage_name} failed: {str(e)}")
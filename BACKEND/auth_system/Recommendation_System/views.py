@@ -4,112 +4,50 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from .models import UploadedImage, Recommendation
 from .serializer import UploadedImageSerializer, RecommendationSerializer
-import torch
-from torch import nn
 import os
 import uuid
+import hashlib
+from io import BytesIO
 from django.conf import settings
-from torchvision import transforms, models
-from PIL import Image, ImageEnhance
-import numpy as np
-
-# Model loading and helper functions
-CLASSIFIER_PATH = os.path.join(settings.BASE_DIR, r'F:\Connecting (1)\Connecting\BACKEND\best_clothing_classifier.pth')
-GENERATOR_PATH = os.path.join(settings.BASE_DIR, r'F:\Connecting (1)\Connecting\BACKEND\cgan_model.pth')
-CLASS_LABELS = ['Full dress', 'Lower wear', 'Upper wear']
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-# Classifier loading
-def load_classifier(model_path):
-    model = models.resnet18(pretrained=False)
-    model.fc = nn.Linear(model.fc.in_features, 3)
-    model.load_state_dict(torch.load(model_path, map_location=device))
-    model.eval()
-    return model
-
-classifier = load_classifier(CLASSIFIER_PATH).to(device)
-
-# Generator model
-class Generator(nn.Module):
-    def __init__(self, z_dim=100, num_classes=3, channels=3, hidden_dim=64):
-        super(Generator, self).__init__()
-        self.input_dim = z_dim + num_classes
-
-        self.input_layer = nn.Sequential(
-            nn.Linear(self.input_dim, hidden_dim * 16 * 4 * 4),
-            nn.BatchNorm1d(hidden_dim * 16 * 4 * 4),
-            nn.ReLU(inplace=True)
-        )
-
-        self.gen = nn.Sequential(
-            nn.ConvTranspose2d(hidden_dim * 16, hidden_dim * 8, 4, 2, 1),
-            nn.BatchNorm2d(hidden_dim * 8),
-            nn.ReLU(inplace=True),
-            nn.ConvTranspose2d(hidden_dim * 8, hidden_dim * 4, 4, 2, 1),
-            nn.BatchNorm2d(hidden_dim * 4),
-            nn.ReLU(inplace=True),
-            nn.ConvTranspose2d(hidden_dim * 4, hidden_dim * 2, 4, 2, 1),
-            nn.BatchNorm2d(hidden_dim * 2),
-            nn.ReLU(inplace=True),
-            nn.ConvTranspose2d(hidden_dim * 2, hidden_dim, 4, 2, 1),
-            nn.BatchNorm2d(hidden_dim),
-            nn.ReLU(inplace=True),
-            nn.ConvTranspose2d(hidden_dim, channels, 4, 2, 1),
-            nn.Tanh()
-        )
-
-    def forward(self, noise, labels):
-        x = torch.cat([noise, labels], dim=1)
-        x = self.input_layer(x)
-        x = x.view(-1, 64*16, 4, 4)
-        return self.gen(x)
-
-generator = Generator(z_dim=100, num_classes=3, channels=3, hidden_dim=64).to(device)
-checkpoint = torch.load(GENERATOR_PATH, map_location=device)
-generator.load_state_dict(checkpoint['generator_state_dict'])
-generator.eval()
-
-# Image processing functions
-def preprocess_image(image_path):
-    transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
-    img = Image.open(image_path).convert("RGB")
-    return transform(img).unsqueeze(0)
-
-def classify_image(model, img_tensor, class_labels):
-    with torch.no_grad():
-        outputs = model(img_tensor)
-    probs = torch.nn.functional.softmax(outputs, dim=1)
-    return class_labels[torch.argmax(probs)], probs.squeeze().tolist()
-
-def enhance_pil(image_pil):
-    enhancer = ImageEnhance.Sharpness(image_pil)
-    image_pil = enhancer.enhance(1.5)
-    enhancer = ImageEnhance.Contrast(image_pil)
-    image_pil = enhancer.enhance(1.0)
-    enhancer = ImageEnhance.Brightness(image_pil)
-    image_pil = enhancer.enhance(0.8)
-    return image_pil
-
-def generate_complementary(generator, predicted_class, class_labels, device):
-    class_mapping = {
-        'Full dress': 'Full dress',
-        'Lower wear': 'Upper wear',
-        'Upper wear': 'Lower wear'
-    }
-    target_class = class_mapping.get(predicted_class, 'Full dress')
-    target_idx = class_labels.index(target_class)
-    label = torch.zeros(1, len(class_labels)).to(device)
-    label[0, target_idx] = 1
-    noise = torch.randn(1, 100).to(device)
-    with torch.no_grad():
-        generated = generator(noise, label)
-    return (generated.squeeze().permute(1, 2, 0).cpu().numpy() + 1) / 2
+from PIL import UnidentifiedImageError
+from .registry import registry
+from .batching import get_classification_batcher
+from .cache import classification_cache, hash_file
+from .pool import complementary_pool
+from .utils import FileWriteThread
+from .similarity import get_similarity_index, embedding_from_bytes, sync_rows
+
+def resolve_class_label(uploaded_image):
+    """Class label for an upload, running the classifier only if it isn't stored or cached."""
+    if uploaded_image.class_label:
+        return uploaded_image.class_label
+
+    if not uploaded_image.content_hash:
+        with uploaded_image.image.open('rb') as f:
+            uploaded_image.content_hash = hash_file(f)
+
+    cached = classification_cache.get(uploaded_image.content_hash)
+    if cached is not None:
+        pred_class, _, embedding = cached
+    else:
+        from . import ml
+        img_tensor = ml.preprocess_image(uploaded_image.image.path)
+        pred_class, probs, embedding = get_classification_batcher().submit(img_tensor)
+        embedding = embedding.tobytes() if embedding is not None else None
+        classification_cache.set(uploaded_image.content_hash, pred_class, probs, embedding)
+
+    uploaded_image.class_label = pred_class
+    uploaded_image.embedding = embedding
+    uploaded_image.save(update_fields=['class_label', 'content_hash', 'embedding'])
+    if embedding is not None:
+        get_similarity_index().add(uploaded_image.id, embedding_from_bytes(embedding))
+    return pred_class
+
+# torch and the model code are imported inside the ML views (see ml.py) so that
+# loading the URLconf doesn't pull in torch or the checkpoints.
 
 # Image upload API
 class ImageUploadView(APIView):
@@ -121,30 +59,42 @@ class ImageUploadView(APIView):
         if serializer.is_valid():
             image_file = request.FILES['image']
             
-            # Ensure the uploads directory exists
-            uploads_dir = os.path.join(settings.MEDIA_ROOT, 'uploads')
-            os.makedirs(uploads_dir, exist_ok=True)
-
-            # Save image to the uploads directory
-            temp_path = os.path.join(uploads_dir, f"{uuid.uuid4()}.jpg")
-            with open(temp_path, 'wb+') as f:
-                for chunk in image_file.chunks():
-                    f.write(chunk)
-
-            # Classify image
-            img_tensor = preprocess_image(temp_path).to(device)
-            pred_class, _ = classify_image(classifier, img_tensor, CLASS_LABELS)
-
-            if pred_class not in CLASS_LABELS:
-                os.remove(temp_path)  # Remove the temp file if classification fails
+            # Read the upload once: hashing, decoding and the final write all use these bytes
+            image_file.seek(0)
+            image_bytes = image_file.read()
+            content_hash = hashlib.sha256(image_bytes).hexdigest()
+
+            # Classify image, unless these exact bytes were classified before
+            from . import ml
+            cached = classification_cache.get(content_hash)
+            if cached is not None:
+                pred_class, _, embedding = cached
+            else:
+                try:
+                    img_tensor = ml.preprocess_image(BytesIO(image_bytes))
+                except (UnidentifiedImageError, OSError):
+                    return Response({"error": "Invalid image file"}, status=400)
+                pred_class, probs, embedding = get_classification_batcher().submit(img_tensor)
+                embedding = embedding.tobytes() if embedding is not None else None
+                classification_cache.set(content_hash, pred_class, probs, embedding)
+
+            if pred_class not in ml.CLASS_LABELS:
                 return Response({"error": "Invalid image category"}, status=400)
 
-            # Save to database
+            # Save to database; the file itself is written off the request path
+            image_name = f"uploads/{uuid.uuid4()}.jpg"
             instance = serializer.save(
                 user=request.user,
                 class_label=pred_class,
-                image=f"uploads/{os.path.basename(temp_path)}"
+                content_hash=content_hash,
+                embedding=embedding,
+                image=image_name
             )
+            # Start the write once the row is committed; a failed write deletes the row again
+            on_failure = UploadedImage.objects.filter(id=instance.id).delete
+            transaction.on_commit(FileWriteThread(image_name, image_bytes, on_failure=on_failure).start)
+            if embedding is not None:
+                get_similarity_index().add(instance.id, embedding_from_bytes(embedding))
 
             return Response({
                 "id": instance.id,
@@ -167,6 +117,13 @@ class RecommendationView(APIView):
         if not image_id:
             return Response({"error": "Missing 'imageId' in request"}, status=400)
 
+        try:
+            count = int(request.data.get('count', 1))
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid count format"}, status=400)
+        if not 1 <= count <= settings.RECOMMENDATION_MAX_CANDIDATES:
+            return Response({"error": f"count must be between 1 and {settings.RECOMMENDATION_MAX_CANDIDATES}"}, status=400)
+
         try:
             image_id = int(image_id)
             uploaded_image = UploadedImage.objects.get(id=image_id, user=request.user)
@@ -177,39 +134,98 @@ class RecommendationView(APIView):
 
         print("✅ Found Uploaded Image:", uploaded_image)
 
-        # Process the image and generate recommendation
-        image_path = uploaded_image.image.path
-        img_tensor = preprocess_image(image_path).to(device)
-
-        # Predict class
-        pred_class, _ = classify_image(classifier, img_tensor, CLASS_LABELS)
+        # Reuse the label stored at upload time; only legacy rows get classified here
+        from . import ml
+        pred_class = resolve_class_label(uploaded_image)
         print(f"✅ Predicted Class: {pred_class}")
 
-        # Generate complementary image
-        generated_image = generate_complementary(generator, pred_class, CLASS_LABELS, device)
-
-        # Convert generated image to a saveable format
-        generated_image = (generated_image * 255).astype(np.uint8)
-        pil_image = Image.fromarray(generated_image)
-        pil_image = pil_image.resize((128, 128))  # Resize to 128x128
-        pil_image = enhance_pil(pil_image)  # Apply enhancements
+        target_class = ml.complementary_class(pred_class)
+        if count == 1:
+            # Serve a pre-generated complementary image; generate inline only if the pool ran dry
+            image_bytes = complementary_pool.pop(target_class)
+            if image_bytes is None:
+                generated_image = ml.generate_complementary(registry.get('generator'), pred_class, ml.CLASS_LABELS, ml.device)
+                image_bytes = ml.encode_jpeg(ml.render_generated(generated_image))
+            candidates = [(image_bytes, None)]
+        else:
+            # k candidates from one generator pass, ranked by classifier confidence
+            ranked = ml.generate_ranked(registry.get('generator'), registry.get('classifier'), target_class, ml.CLASS_LABELS, count)
+            candidates = [(ml.encode_jpeg(ml.render_generated(image)), score) for image, score in ranked]
 
         # Ensure the generated directory exists
         generated_dir = os.path.join(settings.MEDIA_ROOT, 'generated')
         os.makedirs(generated_dir, exist_ok=True)
 
-        # Save the generated image
-        gen_image_name = f"generated/{uuid.uuid4()}.jpg"
-        full_path = os.path.join(settings.MEDIA_ROOT, gen_image_name)
-        pil_image.save(full_path)
+        recommendations = []
+        for image_bytes, score in candidates:
+            # Save the generated image
+            gen_image_name = f"generated/{uuid.uuid4()}.jpg"
+            full_path = os.path.join(settings.MEDIA_ROOT, gen_image_name)
+            with open(full_path, 'wb') as f:
+                f.write(image_bytes)
+            recommendations.append(Recommendation(
+                uploaded_image=uploaded_image,
+                generated_image=gen_image_name,
+                score=score
+            ))
+
+        # Save recommendations to DB
+        recommendations = Recommendation.objects.bulk_create(recommendations)
+
+        results = [{
+            "recommendationId": recommendation.id,
+            "recommendationUrl": request.build_absolute_uri(settings.MEDIA_URL + recommendation.generated_image),
+            "score": recommendation.score
+        } for recommendation in recommendations]
+
+        # Top-level fields describe the best candidate, as for single recommendations
+        return Response({
+            "recommendationId": results[0]["recommendationId"],
+            "recommendationUrl": results[0]["recommendationUrl"],
+            "recommendations": results
+        })
+
+class SimilarImagesView(APIView):
+    permission_classes = [IsAuthenticated]
 
-        # Save recommendation to DB
-        recommendation = Recommendation.objects.create(
-            uploaded_image=uploaded_image,
-            generated_image=gen_image_name
-        )
+    def get(self, request, image_id):
+        uploaded_image = get_object_or_404(UploadedImage, id=image_id, user=request.user)
+        if uploaded_image.embedding is None:
+            return Response({"error": "No embedding stored for this image"}, status=409)
+
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            return Response({"error": "Invalid k format"}, status=400)
+        k = max(1, min(k, settings.RECOMMENDATION_SIMILARITY_MAX_K))
+
+        # Only the requesting user's uploads are candidates; rows this process hasn't indexed yet are pulled in first
+        index = get_similarity_index()
+        user_images = UploadedImage.objects.filter(user=request.user)
+        allowed_ids = sync_rows(index, user_images)
+        matches = index.search(embedding_from_bytes(uploaded_image.embedding), k=k, exclude_id=uploaded_image.id, allowed_ids=allowed_ids)
+        images = user_images.in_bulk([image_id for image_id, _ in matches])
 
         return Response({
-            "recommendationId": recommendation.id,
-            "recommendationUrl": request.build_absolute_uri(settings.MEDIA_URL + gen_image_name)
-        })
\ No newline at end of file
+            "imageId": uploaded_image.id,
+            "similar": [{
+                "id": match_id,
+                "imageUrl": request.build_absolute_uri(images[match_id].image.url),
+                "classLabel": images[match_id].class_label,
+                "score": round(score, 4)
+            } for match_id, score in matches if match_id in images]
+        })
+
+class ModelStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({
+            "models": registry.status(),
+            "inferenceBackend": settings.RECOMMENDATION_INFERENCE_BACKEND,
+            "classifierPrecision": settings.RECOMMENDATION_CLASSIFIER_PRECISION,
+            "classificationBatching": get_classification_batcher().stats(),
+            "classificationCache": classification_cache.stats(),
+            "complementaryPool": complementary_pool.stats(),
+            "similarityIndex": get_similarity_index().stats(),
+        })
@@ -2,6 +2,7 @@ from pathlib import Path
 from datetime import timedelta
 import environ
 import os
+import shutil
 
 env = environ.Env()
 environ.Env.read_env()
@@ -85,6 +86,84 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
     os.path.join(BASE_DIR, "VTON/viton_model/static"),  # ✅ ADD THIS
 ]
+
+# Recommendation_System checkpoints, loaded lazily by Recommendation_System.registry
+RECOMMENDATION_CLASSIFIER_PATH = env('RECOMMENDATION_CLASSIFIER_PATH', default=r'F:\Connecting (1)\Connecting\BACKEND\best_clothing_classifier.pth')
+RECOMMENDATION_GENERATOR_PATH = env('RECOMMENDATION_GENERATOR_PATH', default=r'F:\Connecting (1)\Connecting\BACKEND\cgan_model.pth')
+# 'eager', 'torchscript' or 'onnx'; exported graphs live in RECOMMENDATION_EXPORT_DIR
+RECOMMENDATION_INFERENCE_BACKEND = env('RECOMMENDATION_INFERENCE_BACKEND', default='eager')
+RECOMMENDATION_EXPORT_DIR = env('RECOMMENDATION_EXPORT_DIR', default=os.path.join(BASE_DIR, 'exported_models'))
+# 'float' or 'int8' (built and checked by `manage.py quantize_classifier`)
+RECOMMENDATION_CLASSIFIER_PRECISION = env('RECOMMENDATION_CLASSIFIER_PRECISION', default='float')
+# A fixed, curated image set; never live uploads, so the int8 agreement gate is reproducible
+RECOMMENDATION_CALIBRATION_DIR = env('RECOMMENDATION_CALIBRATION_DIR', default=None)
+RECOMMENDATION_INT8_MIN_AGREEMENT = env.float('RECOMMENDATION_INT8_MIN_AGREEMENT', default=0.97)
+# Classifier inputs are decoded and resized to this square resolution
+RECOMMENDATION_CLASSIFIER_INPUT_SIZE = env.int('RECOMMENDATION_CLASSIFIER_INPUT_SIZE', default=224)
+# Upload classification micro-batching (Recommendation_System.batching)
+RECOMMENDATION_BATCH_MAX_SIZE = env.int('RECOMMENDATION_BATCH_MAX_SIZE', default=8)
+RECOMMENDATION_BATCH_MAX_WAIT_MS = env.float('RECOMMENDATION_BATCH_MAX_WAIT_MS', default=5.0)
+# In-memory entries kept in front of the ClassificationResult table
+RECOMMENDATION_CLASSIFICATION_CACHE_SIZE = env.int('RECOMMENDATION_CLASSIFICATION_CACHE_SIZE', default=10000)
+# Upload similarity search (Recommendation_System.similarity)
+RECOMMENDATION_SIMILARITY_INDEX_DIR = env('RECOMMENDATION_SIMILARITY_INDEX_DIR', default=os.path.join(BASE_DIR, 'similarity_index'))
+RECOMMENDATION_SIMILARITY_NPROBE = env.int('RECOMMENDATION_SIMILARITY_NPROBE', default=4)
+RECOMMENDATION_SIMILARITY_MAX_K = env.int('RECOMMENDATION_SIMILARITY_MAX_K', default=50)
+# Pre-generated complementary images kept per target class (Recommendation_System.pool)
+RECOMMENDATION_POOL_SIZE = env.int('RECOMMENDATION_POOL_SIZE', default=32)
+RECOMMENDATION_POOL_LOW_WATERMARK = env.int('RECOMMENDATION_POOL_LOW_WATERMARK', default=8)
+# Upper bound for RecommendationView's count=k multi-candidate mode
+RECOMMENDATION_MAX_CANDIDATES = env.int('RECOMMENDATION_MAX_CANDIDATES', default=8)
+
+# Virtual try-on pipeline (vton.engine): model-backed stages run in long-lived worker processes
+VTON_MODEL_DIR = env('VTON_MODEL_DIR', default=os.path.join(BASE_DIR, 'VTON', 'viton_model'))
+# Local checksummed checkpoints (vton.weights; fill with manage.py fetch_vton_weights), memory-mapped when loaded
+VTON_WEIGHTS_DIR = env('VTON_WEIGHTS_DIR', default=os.path.join(BASE_DIR, 'VTON', 'weights'))
+VTON_MMAP_WEIGHTS = env.bool('VTON_MMAP_WEIGHTS', default=True)
+# Try-ons running at once, each in its own workspace under VTON_WORKSPACE_ROOT
+VTON_MAX_CONCURRENT_JOBS = env.int('VTON_MAX_CONCURRENT_JOBS', default=2)
+VTON_STAGE_WORKERS = env.int('VTON_STAGE_WORKERS', default=VTON_MAX_CONCURRENT_JOBS)
+# Stages of one job that may run at once (vton.engine.run_dag); independent branches overlap
+VTON_STAGE_THREADS = env.int('VTON_STAGE_THREADS', default=4)
+VTON_KEEP_WORKSPACES = env.bool('VTON_KEEP_WORKSPACES', default=False)
+# Stage scripts exchange files, so workspaces go to RAM-backed /dev/shm when it has
+# VTON_SHM_BYTES_PER_JOB free for every concurrent job (Docker's default 64 MB doesn't)
+# and workspaces aren't kept; otherwise to disk
+VTON_SHM_BYTES_PER_JOB = env.int('VTON_SHM_BYTES_PER_JOB', default=512 * 1024 ** 2)
+VTON_WORKSPACE_ROOT = env('VTON_WORKSPACE_ROOT', default=(
+    '/dev/shm/fashion-oracle-vton'
+    if not VTON_KEEP_WORKSPACES and os.path.isdir('/dev/shm')
+    and shutil.disk_usage('/dev/shm').free >= VTON_SHM_BYTES_PER_JOB * VTON_MAX_CONCURRENT_JOBS
+    else os.path.join(BASE_DIR, 'VTON', 'workspaces')
+))
+# Also write intermediates that only the Python stages use (seg_img.png, composited Output/*.png)
+VTON_DEBUG_DUMP = env.bool('VTON_DEBUG_DUMP', default=False)
+# On-disk LRU caches for reusable try-on artifacts (vton.cache)
+VTON_CACHE_ROOT = env('VTON_CACHE_ROOT', default=os.path.join(BASE_DIR, 'VTON', 'cache'))
+VTON_HUMAN_CACHE_MAX_BYTES = env.int('VTON_HUMAN_CACHE_MAX_BYTES', default=2 * 1024 ** 3)
+VTON_CLOTH_CACHE_MAX_BYTES = env.int('VTON_CLOTH_CACHE_MAX_BYTES', default=1024 ** 3)
+VTON_RESULT_CACHE_MAX_BYTES = env.int('VTON_RESULT_CACHE_MAX_BYTES', default=1024 ** 3)
+# Jobs waiting for a try-on worker (vton.jobs); submissions beyond this get a 503
+VTON_JOB_QUEUE_SIZE = env.int('VTON_JOB_QUEUE_SIZE', default=20)
+# How often idle job workers look in the database for queued jobs left by other processes
+VTON_JOB_POLL_SECONDS = env.float('VTON_JOB_POLL_SECONDS', default=5.0)
+# Running jobs renew a lease every VTON_JOB_HEARTBEAT_SECONDS; jobs whose lease is older than
+# VTON_JOB_LEASE_SECONDS are requeued, and failed after VTON_JOB_MAX_ATTEMPTS claims
+VTON_JOB_HEARTBEAT_SECONDS = env.float('VTON_JOB_HEARTBEAT_SECONDS', default=10.0)
+VTON_JOB_LEASE_SECONDS = env.float('VTON_JOB_LEASE_SECONDS', default=60.0)
+VTON_JOB_MAX_ATTEMPTS = env.int('VTON_JOB_MAX_ATTEMPTS', default=2)
+# Cloths per batched try-on request; the generator renders them in one batch
+VTON_MAX_BATCH_CLOTHS = env.int('VTON_MAX_BATCH_CLOTHS', default=8)
+# Upload limits checked from the file size and image header, before any decode (vton.utils.inspect_upload)
+VTON_MAX_UPLOAD_BYTES = env.int('VTON_MAX_UPLOAD_BYTES', default=15 * 1024 ** 2)
+VTON_MAX_IMAGE_PIXELS = env.int('VTON_MAX_IMAGE_PIXELS', default=40_000_000)
+VTON_CACHE_CHECKPOINTS = env.bool('VTON_CACHE_CHECKPOINTS', default=True)
+# Execution profile of the stage workers: 'cpu' or 'cuda', and intra-op threads per worker (0 = from core count)
+VTON_DEVICE = env('VTON_DEVICE', default='cpu')
+VTON_TORCH_THREADS = env.int('VTON_TORCH_THREADS', default=0)
+# Recent finished jobs aggregated into the stage histograms of the metrics endpoint
+VTON_METRICS_WINDOW = env.int('VTON_METRICS_WINDOW', default=200)
+
 WSGI_APPLICATION = "auth_system.wsgi.application"
 
 AUTH_USER_MODEL = 'home.User'
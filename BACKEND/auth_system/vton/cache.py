@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: restores and eviction are only serialized within this process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = ".lock"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def tree_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+class DiskArtifactCache:
+    """
+    Directory-per-key artifact cache on local disk with a byte budget.
+    An entry's mtime is its last use; the least recently used entries are
+    removed once the cache grows past `max_bytes`. Entries are written to a
+    temporary directory and renamed into place, so readers never see half an entry
+    and several processes can share one cache root. Entries are read through
+    `restore` under a shared lock on the cache root, and eviction takes it
+    exclusively, so an entry can't be removed halfway through a restore.
+    """
+
+    def __init__(self, root, max_bytes, name="cache"):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        self._fallback_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, key):
+        return os.path.join(self.root, key)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """Shared (readers) or exclusive (eviction) flock on the cache root, across processes."""
+        if fcntl is None:
+            with self._fallback_lock:
+                yield
+            return
+        os.makedirs(self.root, exist_ok=True)
+        # flock belongs to the open file, so every caller opens its own handle
+        with open(os.path.join(self.root, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def restore(self, key, restore_entry):
+        """
+        Look up `key` and on a hit call `restore_entry(entry_dir)`, with eviction
+        locked out until it returns. Returns whether there was a hit.
+        """
+        path = self._entry(key)
+        with self._locked(exclusive=False):
+            hit = os.path.isdir(path)
+            if hit:
+                os.utime(path)
+                restore_entry(path)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def put(self, key, files):
+        """
+        Store `files`, a {name in entry: source path (file or directory) or bytes}
+        dict, under `key` and return the entry directory.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_path)
+        for name, source in files.items():
+            target = os.path.join(tmp_path, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if isinstance(source, bytes):
+                with open(target, 'wb') as f:
+                    f.write(source)
+            elif os.path.isdir(source):
+                shutil.copytree(source, target)
+            else:
+                shutil.copy(source, target)
+
+        try:
+            os.rename(tmp_path, self._entry(key))
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)  # Stored concurrently; keep the existing entry
+        self.evict()
+        return self._entry(key)
+
+    def evict(self):
+        with self._locked(exclusive=True):
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for key in os.listdir(self.root):
+            path = self._entry(key)
+            if key == LOCK_FILE:
+                continue
+            if key.startswith('.tmp-'):
+                # Leftover from a crashed writer
+                if time.time() - os.path.getmtime(path) > 3600:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            try:
+                entries.append((os.path.getmtime(path), tree_size(path), path))
+            except FileNotFoundError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.debug(f"{self.name}: evicted {os.path.basename(path)}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 3) if lookups else None,
+                "maxBytes": self.max_bytes,
+            }
@@ -0,0 +1,69 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# Colour the generator expects behind the person (and in place of pure-black channels)
+BACKDROP_VALUE = 215
+# Maps channel value 0 to the backdrop and leaves every other value as it is
+_ZERO_TO_BACKDROP = np.arange(256, dtype=np.uint8)
+_ZERO_TO_BACKDROP[0] = BACKDROP_VALUE
+
+
+class FrameBufferPool:
+    """
+    Reusable frame-sized arrays for post-processing, so a job's compositing
+    doesn't allocate new full-frame temporaries. Keeps a few buffers per shape.
+    """
+
+    def __init__(self, per_shape=4):
+        self.per_shape = per_shape
+        self._free = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def borrow(self, shape, dtype=np.uint8):
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            buffer = self._free[key].pop() if self._free[key] else None
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+        try:
+            yield buffer
+        finally:
+            with self._lock:
+                if len(self._free[key]) < self.per_shape:
+                    self._free[key].append(buffer)
+
+
+frame_buffers = FrameBufferPool()
+
+
+def person_on_backdrop(ori_img, mask_img, out):
+    """
+    The generator's person image: the photo where `mask_img` is set, backdrop
+    colour elsewhere and for zero-valued channels, written into `out`.
+    """
+    cv2.LUT(ori_img, _ZERO_TO_BACKDROP, dst=out)
+    np.copyto(out, BACKDROP_VALUE, where=(mask_img == 0)[..., None])
+    return out
+
+
+def composite_person(generated, ori_img, mask_img, out):
+    """
+    Paste the generated person over the original background, written into `out`.
+    A per-pixel select rather than uint8 `img + background` arithmetic, so nothing
+    can wrap around where resized masks and backgrounds overlap.
+    """
+    np.copyto(out, ori_img)
+    np.copyto(out, generated, where=(mask_img != 0)[..., None])
+    return out
+
+
+def encode_png(img):
+    ok, encoded = cv2.imencode('.png', img)
+    if not ok:
+        raise ValueError("Could not encode the try-on result")
+    return encoded.tobytes()
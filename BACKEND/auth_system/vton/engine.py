@@ -0,0 +1,232 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from . import stage_worker
+from .cache import tree_size
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One step of the try-on pipeline. `func(ctx)` reads and writes the per-job
+    context dict; plain Python stages run in a scheduler thread. `deps` names
+    the stages whose outputs this one reads. `inputs`/`outputs` are the files or
+    directories it reads and writes (workspace-relative, or callables taking ctx;
+    in-memory bytes count their length), used only to report input/output sizes. `func` may return the usage of work
+    it handed to worker processes, which is added to its own.
+    """
+
+    def __init__(self, name, func=None, deps=(), inputs=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.inputs = inputs
+        self.outputs = outputs
+
+    def run(self, ctx):
+        """
+        Run the stage; returns its CPU seconds and the RSS peak and growth sampled
+        while it ran. Memory of work handed to a worker process is measured there;
+        otherwise it is this server process's, shared with any stage running beside it.
+        """
+        cpu_start = time.thread_time()
+        with stage_worker.RssSampler() as rss:
+            delegated = self.func(ctx) or {}
+        usage = rss.usage()
+        if delegated.get("peakRssMb") is not None:
+            usage = {key: delegated[key] for key in ("peakRssMb", "rssGrowthMb")}
+        return {"cpu": time.thread_time() - cpu_start + delegated.get("cpu", 0), **usage}
+
+    def size_of(self, ctx, paths):
+        total = 0
+        for path in paths(ctx) if callable(paths) else paths:
+            if path is None:
+                continue
+            if isinstance(path, bytes):
+                total += len(path)
+                continue
+            path = os.path.join(ctx['root'], path(ctx) if callable(path) else path)
+            if os.path.exists(path):
+                total += tree_size(path)
+        return total
+
+
+class ScriptStage(Stage):
+    """
+    A viton_model script run inside this stage's long-lived worker process, so
+    torch, the script's own imports and its checkpoint tensors stay loaded between
+    jobs (the script itself, and so its network construction, runs every time).
+    `args` items may be callables taking the context, for per-job values, or
+    `args` itself a callable returning the whole list. An `exclusive` stage runs
+    with no other stage of its job beside it, so its worker gets more threads.
+    """
+
+    def __init__(self, name, script, args=(), cwd='.', deps=(), inputs=(), outputs=(), exclusive=False):
+        super().__init__(name, deps=deps, inputs=inputs, outputs=outputs)
+        self.script = script
+        self.args = args
+        self.cwd = cwd
+        self.exclusive = exclusive
+
+    def run(self, ctx):
+        cwd = os.path.join(ctx['root'], self.cwd)
+        args = self.args(ctx) if callable(self.args) else [arg(ctx) if callable(arg) else arg for arg in self.args]
+        return engine.call(self.name, stage_worker.run_script, os.path.join(cwd, self.script), args, cwd,
+                           threads=stage_threads(self.exclusive))
+
+
+def stage_threads(exclusive=False):
+    """
+    Intra-op threads for one stage worker (VTON_TORCH_THREADS, or derived from the
+    core count). Branch stages share the cores with the other branches of their job;
+    an exclusive stage only with the other running jobs.
+    """
+    if settings.VTON_TORCH_THREADS:
+        return settings.VTON_TORCH_THREADS
+    sharing = settings.VTON_MAX_CONCURRENT_JOBS * (1 if exclusive else settings.VTON_STAGE_THREADS)
+    return max(1, (os.cpu_count() or 1) // sharing)
+
+
+class StageEngine:
+    """
+    Owns one process pool per script stage. Each stage gets its own processes so
+    scripts with clashing module names (utils, networks, ...) never share sys.modules.
+    """
+
+    def __init__(self):
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, stage_name, threads):
+        with self._lock:
+            executor = self._executors.get(stage_name)
+            if executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers=settings.VTON_STAGE_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=stage_worker.warm_up,
+                    initargs=(settings.VTON_CACHE_CHECKPOINTS, settings.VTON_DEVICE, threads, settings.VTON_MMAP_WEIGHTS,
+                              (settings.VTON_WEIGHTS_DIR, settings.VTON_MODEL_DIR)),
+                )
+                self._executors[stage_name] = executor
+            return executor
+
+    def call(self, stage_name, func, *args, threads=None):
+        try:
+            return self._executor(stage_name, threads).submit(func, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start fresh processes for the next job
+            logger.error(f"Worker pool for stage '{stage_name}' broke, restarting it")
+            with self._lock:
+                self._executors.pop(stage_name, None)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+engine = StageEngine()
+
+
+def round_or_none(value, digits):
+    return None if value is None else round(value, digits)
+
+
+def _run_measured(stage, ctx, origin):
+    input_bytes = stage.size_of(ctx, stage.inputs)
+    start = time.perf_counter()
+    usage = stage.run(ctx)
+    end = time.perf_counter()
+    return {
+        "start": round(start - origin, 3),
+        "end": round(end - origin, 3),
+        "wall": round(end - start, 3),
+        "cpu": round(usage["cpu"], 3),
+        "peakRssMb": round_or_none(usage["peakRssMb"], 1),
+        "rssGrowthMb": round_or_none(usage["rssGrowthMb"], 1),
+        "inputBytes": input_bytes,
+        "outputBytes": stage.size_of(ctx, stage.outputs),
+    }
+
+
+def run_dag(stages, ctx, on_stage=None, done=()):
+    """
+    Run `stages` as a dependency graph: every stage whose deps have finished is
+    started right away on a thread pool, so independent branches overlap.
+    Stages named in `done` count as already finished (e.g. restored from a cache);
+    a stage can also add names to ctx['skipped'] while the graph runs, and those
+    stages then finish without running once their own deps have.
+    `on_stage(name, finished)` is called from this thread before and after each stage.
+    Per-stage start/end offsets, wall and CPU seconds, RSS peak and growth during
+    the stage and input/output bytes go to ctx['timings']['stages'].
+    """
+    origin = ctx.setdefault('started_at', time.perf_counter())
+    stage_timings = ctx.setdefault('timings', {}).setdefault('stages', {})
+    skipped = ctx.setdefault('skipped', set())
+    pending = {stage.name: stage for stage in stages if stage.name not in done}
+    finished = set(done)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=settings.VTON_STAGE_THREADS, thread_name_prefix='vton-stage') as pool:
+        while pending or running:
+            ready = [stage for stage in pending.values() if all(dep in finished for dep in stage.deps)]
+            # Skipping one stage can make its dependents ready, so settle skips before starting anything
+            while any(stage.name in skipped for stage in ready):
+                for stage in ready:
+                    if stage.name in skipped:
+                        del pending[stage.name]
+                        finished.add(stage.name)
+                        if on_stage:
+                            on_stage(stage.name, True)
+                ready = [stage for stage in pending.values() if all(dep in finished for dep in stage.deps)]
+            if not pending and not running:
+                break
+            for stage in ready:
+                del pending[stage.name]
+                logger.debug(f"Running VTON stage '{stage.name}'")
+                if on_stage:
+                    on_stage(stage.name, False)
+                running[pool.submit(_run_measured, stage, ctx, origin)] = stage
+
+            if not running:
+                raise RuntimeError(f"Unsatisfiable stage dependencies: {', '.join(sorted(pending))}")
+
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                stage = running.pop(future)
+                # Raising here leaves the pool's `with` block, which waits for stages already running
+                stage_timings[stage.name] = future.result()
+                finished.add(stage.name)
+                if on_stage:
+                    on_stage(stage.name, True)
+    return ctx
+
+
+def critical_path(stages, stage_timings):
+    """
+    The chain of stages that determined the job's end-to-end time: walk back from
+    the last stage to finish through whichever dependency finished last.
+    """
+    deps = {stage.name: stage.deps for stage in stages}
+    if not stage_timings:
+        return []
+    current = max(stage_timings, key=lambda name: stage_timings[name]["end"])
+    path = [current]
+    while True:
+        ran_deps = [dep for dep in deps.get(current, ()) if dep in stage_timings]
+        if not ran_deps:
+            break
+        current = max(ran_deps, key=lambda name: stage_timings[name]["end"])
+        path.append(current)
+    return path[::-1]
@@ -0,0 +1,284 @@
+import logging
+import os
+import queue
+import socket
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import content_hash
+from .models import VTONHistory, VTONJob
+from .utils import save_temp_file
+from .viton_pipeline import RESULT_FILE, STAGES, result_cache, run_virtual_tryon_pipeline
+from .workspace import Workspace, tryon_slots
+
+logger = logging.getLogger(__name__)
+
+
+class TryOnError(Exception):
+    pass
+
+
+def read_image(instance):
+    with instance.image.open('rb') as image_file:
+        return image_file.read()
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def image_hash(instance):
+    # Rows uploaded before content hashing have no stored hash
+    return instance.content_hash or content_hash(read_image(instance))
+
+
+def result_key(human_hash, cloth_hash, quality):
+    """Result-cache key: the content hashes of both inputs plus the quality tier."""
+    return content_hash(f"{human_hash}:{cloth_hash}:{quality}".encode())
+
+
+def save_result(user, data):
+    """Write an encoded composite to media storage under vton_results/ and return its name."""
+    name = default_storage.save(f"vton_results/vton_result_{user.id}_{uuid.uuid4().hex}.png", ContentFile(data))
+    logger.debug(f"Generated image saved to: {name}")
+    return name
+
+
+def execute_tryon(user, cloth_instances, human_instance, on_stage=None, quality="full"):
+    """
+    Try stored cloth images on a stored human image, save each composite to
+    media/vton_results/ and record it in VTONHistory.
+    Results already in the result cache are reused as they are; the remaining
+    cloths are tried on in one batched pipeline pass in a fresh workspace,
+    at the `quality` tier (see viton_pipeline.QUALITY_TIERS).
+    The pipeline pass's stage timings are stored on the first history it produced,
+    for synchronous and queued try-ons alike (see vton.metrics).
+    Returns (VTONHistory per cloth in order, stage timings with the critical path).
+    """
+    human_hash = image_hash(human_instance)
+    keys = [result_key(human_hash, image_hash(cloth_instance), quality) for cloth_instance in cloth_instances]
+
+    generated_images = [None] * len(cloth_instances)
+    missing = []
+    for index, key in enumerate(keys):
+        cached = []
+        if result_cache.restore(key, lambda entry: cached.append(read_file(os.path.join(entry, RESULT_FILE)))):
+            generated_images[index] = save_result(user, cached[0])
+        else:
+            missing.append(index)
+    logger.debug(f"Result cache: {len(cloth_instances) - len(missing)} of {len(cloth_instances)} try-ons reused")
+
+    timings = {}
+    if missing:
+        # Take a slot before creating the workspace, so waiting requests don't hold scratch space
+        with tryon_slots, Workspace() as workspace:
+            with human_instance.image.open('rb') as human_file:
+                human_path = save_temp_file(human_file, workspace.root, image_type="human")
+            cloth_paths = []
+            for position, index in enumerate(missing):
+                with cloth_instances[index].image.open('rb') as cloth_file:
+                    cloth_paths.append(save_temp_file(cloth_file, workspace.root, image_type="cloth", index=position))
+            logger.debug(f"Temp files saved: cloths={cloth_paths}, human={human_path}")
+
+            results, timings = run_virtual_tryon_pipeline(
+                human_path, cloth_paths, workspace, on_stage=on_stage, quality=quality
+            )
+        logger.debug(f"Pipeline finished in {timings['total']}s, critical path: {timings['criticalPath']}")
+        if not results or any(result is None for result in results):
+            raise TryOnError("Virtual try-on pipeline failed to generate output.")
+
+        for index, result in zip(missing, results):
+            generated_images[index] = save_result(user, result)
+            result_cache.put(keys[index], {RESULT_FILE: result})
+
+    histories = [
+        VTONHistory.objects.create(
+            user=user,
+            cloth_image=cloth_instance,
+            human_image=human_instance,
+            generated_image=generated_image,
+            timings=timings if missing and index == missing[0] else {}
+        )
+        for index, (cloth_instance, generated_image) in enumerate(zip(cloth_instances, generated_images))
+    ]
+    return histories, timings
+
+
+class QueueFull(Exception):
+    pass
+
+
+# Identifies this server process as a job's owner. The random part keeps it unique
+# when a restarted container reuses the hostname and pids.
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Heartbeat(threading.Thread):
+    """Renews a running job's lease every VTON_JOB_HEARTBEAT_SECONDS until stopped."""
+
+    def __init__(self, job_id):
+        super().__init__(name=f"vton-job-heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(settings.VTON_JOB_HEARTBEAT_SECONDS):
+                VTONJob.objects.filter(id=self.job_id, status='running', worker=PROCESS_ID).update(
+                    heartbeat_at=timezone.now()
+                )
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def recover_stale_jobs():
+    """
+    Requeue 'running' jobs whose lease (heartbeat_at) is older than
+    VTON_JOB_LEASE_SECONDS: their owner stopped, whichever process it was. Jobs
+    that have already been claimed VTON_JOB_MAX_ATTEMPTS times are failed instead.
+    Returns the number of jobs requeued or failed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.VTON_JOB_LEASE_SECONDS)
+    # Jobs claimed before leases existed have no heartbeat at all
+    expired = VTONJob.objects.filter(Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True), status='running')
+    failed = expired.filter(attempts__gte=settings.VTON_JOB_MAX_ATTEMPTS).update(
+        status='failed', error="Interrupted by a server restart", stage='', finished_at=timezone.now()
+    )
+    requeued = expired.filter(attempts__lt=settings.VTON_JOB_MAX_ATTEMPTS).update(
+        status='queued', worker='', stage='', completed_stages=[], heartbeat_at=None
+    )
+    return failed + requeued
+
+
+def next_queued_job():
+    """Id of the oldest queued job, e.g. one left behind by a process that stopped."""
+    return VTONJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True).first()
+
+
+class TryOnJobQueue:
+    """
+    Bounded in-process queue of VTONJob ids served by VTON_MAX_CONCURRENT_JOBS
+    dedicated worker threads, started with the first job this process submits
+    (or by `manage.py run_vton_jobs`). Job state lives in the database: a worker
+    claims a job by atomically moving it from 'queued' to 'running', so a job is
+    run once even when several processes see it, and holds it with a heartbeat
+    lease. Idle workers poll the database every VTON_JOB_POLL_SECONDS: they requeue
+    running jobs whose lease expired (see recover_stale_jobs) and pick up queued
+    jobs, including those left behind by a process that stopped.
+    """
+
+    def __init__(self, max_size, workers):
+        self._queue = queue.Queue(maxsize=max_size)
+        self.workers = workers
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        self.start()
+        try:
+            self._queue.put_nowait(job.id)
+        except queue.Full:
+            job.status = 'failed'
+            job.error = "Try-on queue is full"
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+            raise QueueFull(job.error)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return self._threads
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"vton-job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            return self._threads
+
+    def _work(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=settings.VTON_JOB_POLL_SECONDS)
+                from_queue = True
+            except queue.Empty:
+                job_id, from_queue = None, False
+            try:
+                if job_id is None:
+                    recovered = recover_stale_jobs()
+                    if recovered:
+                        logger.warning(f"Recovered {recovered} VTON job(s) whose worker stopped")
+                    job_id = next_queued_job()
+                if job_id is not None:
+                    run_job(job_id)
+            except Exception as e:
+                logger.error(f"VTON job {job_id} crashed: {str(e)}")
+            finally:
+                close_old_connections()
+                if from_queue:
+                    self._queue.task_done()
+
+
+def run_job(job_id):
+    # Claim the job atomically; another worker (maybe in another process) may have got it first
+    now = timezone.now()
+    claimed = VTONJob.objects.filter(id=job_id, status='queued').update(
+        status='running', started_at=now, heartbeat_at=now, total_stages=len(STAGES),
+        worker=PROCESS_ID, attempts=F('attempts') + 1
+    )
+    if not claimed:
+        return
+    job = VTONJob.objects.select_related('user', 'cloth_image', 'human_image').get(id=job_id)
+    # Writes only land while this process still holds the job's lease
+    owned = VTONJob.objects.filter(id=job_id, status='running', worker=PROCESS_ID)
+
+    running = set()
+
+    def on_stage(stage_name, finished):
+        # Independent stages overlap, so `stage` lists every stage currently running
+        if finished:
+            running.discard(stage_name)
+            job.completed_stages = job.completed_stages + [stage_name]
+        else:
+            running.add(stage_name)
+        job.stage = ", ".join(sorted(running))[:50]
+        owned.update(stage=job.stage, completed_stages=job.completed_stages, heartbeat_at=timezone.now())
+
+    heartbeat = Heartbeat(job_id)
+    heartbeat.start()
+    try:
+        if job.cloth_image is None or job.human_image is None:
+            raise TryOnError("Input images were deleted")
+        histories, job.timings = execute_tryon(
+            job.user, [job.cloth_image], job.human_image, on_stage=on_stage, quality=job.quality
+        )
+        job.history = histories[0]
+        job.status = 'done'
+    except Exception as e:
+        logger.error(f"VTON job {job.id} failed: {str(e)}")
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        heartbeat.stop()
+    job.stage = ''
+    job.finished_at = timezone.now()
+    if not owned.update(history=job.history, timings=job.timings, status=job.status, error=job.error,
+                        stage=job.stage, finished_at=job.finished_at):
+        logger.warning(f"VTON job {job.id} lost its lease before finishing; its result was not recorded")
+
+
+job_queue = TryOnJobQueue(max_size=settings.VTON_JOB_QUEUE_SIZE, workers=settings.VTON_MAX_CONCURRENT_JOBS)
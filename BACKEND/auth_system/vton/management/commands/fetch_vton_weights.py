@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vton.weights import WEIGHTS, WeightStoreError, weight_store
+
+
+class Command(BaseCommand):
+    help = "Copy or download every VTON checkpoint into the local weight store and record its SHA-256."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f"Checkpoints to fetch (default: all of {', '.join(WEIGHTS)}).")
+        parser.add_argument('--force', action='store_true', help="Fetch again even if the checkpoint is stored.")
+        parser.add_argument('--verify', action='store_true', help="Only rehash stored checkpoints against the manifest.")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(WEIGHTS)
+        unknown = set(names) - set(WEIGHTS)
+        if unknown:
+            raise CommandError(f"Unknown checkpoints: {', '.join(sorted(unknown))}")
+
+        failed = False
+        for name in names:
+            if options['verify']:
+                ok, message = weight_store.verify(name)
+                failed |= not ok
+                style = self.style.SUCCESS if ok else self.style.ERROR
+                self.stdout.write(style(f"{name:<12}{message}"))
+                continue
+
+            if not options['force'] and weight_store.stored(name):
+                self.stdout.write(f"{name:<12}already stored")
+                continue
+            try:
+                path = weight_store.fetch(name)
+            except (WeightStoreError, OSError) as e:
+                failed = True
+                self.stdout.write(self.style.ERROR(f"{name:<12}{str(e)}"))
+                continue
+            self.stdout.write(self.style.SUCCESS(f"{name:<12}{path}"))
+
+        if failed:
+            raise CommandError("Some checkpoints are missing or corrupt.")
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from vton.jobs import job_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Run try-on job workers in the foreground: requeue jobs whose worker stopped renewing "
+        "their lease, and claim queued jobs from the database as they arrive."
+    )
+
+    def handle(self, *args, **options):
+        threads = job_queue.start()
+        self.stdout.write(f"Running {len(threads)} try-on job worker(s); Ctrl-C to stop.")
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping; jobs still running are requeued once their lease expires.")
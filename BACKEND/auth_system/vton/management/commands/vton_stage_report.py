@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from vton.metrics import mean, percentile, recent_job_metrics, values_of
+
+
+class Command(BaseCommand):
+    help = "Print per-stage wall time, CPU time, RSS and I/O percentiles over the last N try-on pipeline passes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=100, help="Number of most recent pipeline passes to include.")
+
+    def handle(self, *args, **options):
+        per_stage, totals, critical, jobs = recent_job_metrics(options['jobs'])
+        if not jobs:
+            self.stdout.write("No try-on pipeline passes with stage metrics yet.")
+            return
+
+        self.stdout.write(
+            f"{'stage':<18}{'n':>5}{'wall p50':>10}{'p90':>8}{'p99':>8}{'cpu p50':>9}{'p90':>8}"
+            f"{'rss MB':>9}{'+MB':>7}{'in MB':>8}{'out MB':>8}{'critical':>10}"
+        )
+        # Order stages by when they typically start
+        order = sorted(per_stage, key=lambda name: percentile(values_of(per_stage[name], 'start'), 50) or 0)
+        for stage_name in order:
+            metrics_list = per_stage[stage_name]
+            wall = values_of(metrics_list, 'wall')
+            cpu = values_of(metrics_list, 'cpu')
+            self.stdout.write(
+                f"{stage_name:<18}{len(metrics_list):>5}"
+                f"{fmt(percentile(wall, 50)):>10}{fmt(percentile(wall, 90)):>8}{fmt(percentile(wall, 99)):>8}"
+                f"{fmt(percentile(cpu, 50)):>9}{fmt(percentile(cpu, 90)):>8}"
+                f"{fmt(max(values_of(metrics_list, 'peakRssMb'), default=None), 0):>9}"
+                f"{fmt(max(values_of(metrics_list, 'rssGrowthMb'), default=None), 0):>7}"
+                f"{fmt(megabytes(mean(values_of(metrics_list, 'inputBytes')))):>8}"
+                f"{fmt(megabytes(mean(values_of(metrics_list, 'outputBytes')))):>8}"
+                f"{critical[stage_name] * 100 // jobs:>9}%"
+            )
+        self.stdout.write(
+            f"\n{jobs} passes, end-to-end p50 {fmt(percentile(totals, 50))}s, "
+            f"p90 {fmt(percentile(totals, 90))}s, p99 {fmt(percentile(totals, 99))}s"
+        )
+
+
+def megabytes(value):
+    return value / 2 ** 20 if value is not None else None
+
+
+def fmt(value, digits=2):
+    return '-' if value is None else f"{value:.{digits}f}"
@@ -0,0 +1,53 @@
+from collections import Counter, defaultdict
+
+from .models import VTONHistory
+
+# Upper bounds (seconds) of the stage time histogram buckets
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def recent_job_metrics(limit):
+    """
+    Per-stage metrics of the last `limit` pipeline passes, from synchronous and
+    queued try-ons alike, as ({stage: [metrics, ...]}, [pass total seconds, ...],
+    Counter of critical-path stages, pass count).
+    """
+    timings_list = (VTONHistory.objects.exclude(timings={})
+                    .order_by('-created_at').values_list('timings', flat=True)[:limit])
+    per_stage = defaultdict(list)
+    totals = []
+    critical = Counter()
+    jobs = 0
+    for timings in timings_list:
+        jobs += 1
+        for stage_name, metrics in timings.get('stages', {}).items():
+            per_stage[stage_name].append(metrics)
+        if 'total' in timings:
+            totals.append(timings['total'])
+        critical.update(timings.get('criticalPath', []))
+    return per_stage, totals, critical, jobs
+
+
+def values_of(metrics_list, key):
+    # Passes recorded before a metric existed lack its key; RSS is None where it can't be read
+    return [metrics[key] for metrics in metrics_list if metrics.get(key) is not None]
+
+
+def histogram(values, buckets=SECONDS_BUCKETS):
+    """Cumulative bucket counts, Prometheus style: observations <= each bound."""
+    counts = [{"le": bound, "count": sum(1 for value in values if value <= bound)} for bound in buckets]
+    counts.append({"le": "+Inf", "count": len(values)})
+    return {"buckets": counts, "count": len(values), "sum": round(sum(values), 3)}
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, `q` in 0-100; None without data."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil without floats
+    return ordered[int(rank) - 1]
+
+
+def mean(values):
+    return sum(values) / len(values) if values else None
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vton", "0003_vtonjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vtonjob",
+            name="timings",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vton", "0004_vtonjob_timings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vtonjob",
+            name="quality",
+            field=models.CharField(
+                choices=[("preview", "Preview"), ("full", "Full resolution")],
+                default="full",
+                max_length=10,
+            ),
+        ),
+    ]
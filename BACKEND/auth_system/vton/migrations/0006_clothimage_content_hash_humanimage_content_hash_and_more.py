@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:20
+
+import vton.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vton", "0005_vtonjob_quality"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="clothimage",
+            name="content_hash",
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="humanimage",
+            name="content_hash",
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="clothimage",
+            name="image",
+            field=models.ImageField(upload_to=vton.models.content_addressed_path),
+        ),
+        migrations.AlterField(
+            model_name="humanimage",
+            name="image",
+            field=models.ImageField(upload_to=vton.models.content_addressed_path),
+        ),
+    ]
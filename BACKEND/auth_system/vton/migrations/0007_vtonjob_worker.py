@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vton", "0006_clothimage_content_hash_humanimage_content_hash_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vtonjob",
+            name="worker",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+def copy_job_timings(apps, schema_editor):
+    # Stage metrics now live on the history row, so earlier queued jobs keep counting
+    VTONJob = apps.get_model("vton", "VTONJob")
+    VTONHistory = apps.get_model("vton", "VTONHistory")
+    jobs = VTONJob.objects.filter(status="done", history__isnull=False).exclude(timings={})
+    for history_id, timings in jobs.values_list("history_id", "timings").iterator():
+        VTONHistory.objects.filter(id=history_id).update(timings=timings)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vton", "0007_vtonjob_worker"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vtonhistory",
+            name="timings",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(copy_job_timings, migrations.RunPython.noop),
+    ]
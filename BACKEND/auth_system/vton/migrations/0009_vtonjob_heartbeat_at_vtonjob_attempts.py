@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("vton", "0008_vtonhistory_timings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vtonjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="vtonjob",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,21 +1,111 @@
 # models.py (Updated to use settings.AUTH_USER_MODEL)
-from django.db import models
+import hashlib
+import os
+import uuid
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 
-class ClothImage(models.Model):
-    image = models.ImageField(upload_to='cloth_images/')
-    uploaded_at = models.DateTimeField(auto_now_add=True)
+def content_addressed_path(instance, filename):
+    """<upload dir>/<first two hash chars>/<sha256><ext>: identical uploads share one file."""
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    return f"{instance.UPLOAD_DIR}/{instance.content_hash[:2]}/{instance.content_hash}{extension}"
+
+class ContentHashedImage(models.Model):
+    """An uploaded image stored once per distinct content; rows from before hashing have no hash."""
+    UPLOAD_DIR = ''
 
-class HumanImage(models.Model):
-    image = models.ImageField(upload_to='human_images/')
+    image = models.ImageField(upload_to=content_addressed_path)
+    content_hash = models.CharField(max_length=64, unique=True, null=True, editable=False)  # SHA-256 of the image bytes
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_upload(cls, uploaded_file, data=None):
+        """
+        The row for these image bytes, creating it and writing its file only the
+        first time they are uploaded. `data` may pass bytes already read from the upload.
+        """
+        if data is None:
+            uploaded_file.seek(0)
+            data = uploaded_file.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+        existing = cls.objects.filter(content_hash=content_hash).first()
+        if existing:
+            return existing
+
+        instance = cls(content_hash=content_hash)
+        storage = instance.image.storage
+        name = cls._meta.get_field('image').generate_filename(instance, uploaded_file.name)
+        written = not storage.exists(name)
+        if written:
+            instance.image.save(uploaded_file.name, ContentFile(data), save=False)
+        else:
+            instance.image.name = name  # File outlived its row; reuse it
+        try:
+            with transaction.atomic():
+                instance.save()
+        except IntegrityError:  # The same bytes were uploaded concurrently
+            winner = cls.objects.get(content_hash=content_hash)
+            # Storage renames a clashing write, so the file written here is an orphan
+            # unless the winning row ended up pointing at it
+            if written and instance.image.name != winner.image.name:
+                storage.delete(instance.image.name)
+            return winner
+        return instance
+
+class ClothImage(ContentHashedImage):
+    UPLOAD_DIR = 'cloth_images'
+
+class HumanImage(ContentHashedImage):
+    UPLOAD_DIR = 'human_images'
+
 class VTONHistory(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='vton_history')
     cloth_image = models.ForeignKey(ClothImage, on_delete=models.SET_NULL, null=True, related_name='vton_records')
     human_image = models.ForeignKey(HumanImage, on_delete=models.SET_NULL, null=True, related_name='vton_records')
     generated_image = models.ImageField(upload_to='vton_results/')
+    # Stage metrics of the pipeline pass that produced this result; a batched pass is
+    # recorded once, on its first history, and results reused from the cache have none
+    timings = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']  # Latest records first
+
+class VTONJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    QUALITY_CHOICES = [
+        ('preview', 'Preview'),
+        ('full', 'Full resolution'),
+    ]
+
+    id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='vton_jobs')
+    cloth_image = models.ForeignKey(ClothImage, on_delete=models.SET_NULL, null=True, related_name='vton_jobs')
+    human_image = models.ForeignKey(HumanImage, on_delete=models.SET_NULL, null=True, related_name='vton_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    quality = models.CharField(max_length=10, choices=QUALITY_CHOICES, default='full')
+    stage = models.CharField(max_length=50, blank=True)  # Stage currently running
+    worker = models.CharField(max_length=100, blank=True)  # Owner of the job's lease, see vton.jobs.PROCESS_ID
+    heartbeat_at = models.DateTimeField(null=True)  # Lease renewed by the owner while the job runs
+    attempts = models.PositiveIntegerField(default=0)  # Times the job has been claimed
+    completed_stages = models.JSONField(default=list)
+    total_stages = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    history = models.OneToOneField(VTONHistory, on_delete=models.SET_NULL, null=True, related_name='job')
+    timings = models.JSONField(default=dict, blank=True)  # Per-stage times, CPU, peak RSS, I/O bytes and the critical path
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
 
     class Meta:
-        ordering = ['-created_at']  # Latest records first
\ No newline at end of file
+        ordering = ['-created_at']
@@ -1,15 +1,15 @@
 from rest_framework import serializers
-from .models import ClothImage, HumanImage, VTONHistory
+from .models import ClothImage, HumanImage, VTONHistory, VTONJob
 
 class ClothImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ClothImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'content_hash', 'uploaded_at']
 
 class HumanImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = HumanImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'content_hash', 'uploaded_at']
 
 class VTONHistorySerializer(serializers.ModelSerializer):
     cloth_image = ClothImageSerializer()
@@ -18,4 +18,9 @@ class VTONHistorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = VTONHistory
-        fields = ['id', 'cloth_image', 'human_image', 'generated_image', 'created_at']
\ No newline at end of file
+        fields = ['id', 'cloth_image', 'human_image', 'generated_image', 'created_at']
+
+class VTONJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VTONJob
+        fields = ['id', 'status', 'quality', 'stage', 'completed_stages', 'total_stages', 'timings', 'error', 'created_at', 'started_at', 'finished_at']
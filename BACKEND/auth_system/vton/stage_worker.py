@@ -0,0 +1,166 @@
+"""
+Code that runs inside the long-lived VTON stage worker processes.
+Kept free of Django imports so spawned workers start quickly.
+"""
+import functools
+import importlib
+import os
+import runpy
+import sys
+import threading
+import time
+import zipfile
+
+PRELOAD_MODULES = ('numpy', 'cv2', 'torch', 'torchvision')
+
+
+def warm_up(cache_checkpoints=True, device='cpu', threads=None, mmap_weights=True, cache_roots=()):
+    """
+    Worker initializer: pin the device and thread counts, then import the heavy
+    libraries once for the life of the process. Thread settings must be in the
+    environment before torch/numpy start their pools. Only checkpoints under
+    `cache_roots` (the weight store and the model checkout) are kept resident.
+    """
+    if threads:
+        for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[variable] = str(threads)
+    if device == 'cpu':
+        os.environ['CUDA_VISIBLE_DEVICES'] = ''
+
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+    if threads and 'cv2' in sys.modules:
+        sys.modules['cv2'].setNumThreads(threads)
+    if 'torch' in sys.modules:
+        torch = sys.modules['torch']
+        if threads:
+            torch.set_num_threads(threads)
+            torch.set_num_interop_threads(1)
+        _patch_torch_load(torch, cache_checkpoints, map_location='cpu' if device == 'cpu' else None,
+                          mmap=mmap_weights, cache_roots=cache_roots)
+
+
+def _patch_torch_load(torch, cache_checkpoints, map_location=None, mmap=False, cache_roots=()):
+    """
+    The stage scripts call torch.load on every run, mostly without map_location.
+    On CPU hosts, default map_location to 'cpu' so GPU-saved checkpoints load.
+    With `mmap`, zip-format checkpoints are memory-mapped instead of read into
+    memory, so the stage workers share one page-cached copy of the weights.
+    With `cache_checkpoints`, keep each checkpoint under `cache_roots` resident so
+    repeat runs skip the disk read and unpickling: one entry per resolved path,
+    replaced when the file's mtime changes. The map_location of the load that
+    fills an entry is the one applied, so callers passing a fresh lambda per run
+    can't multiply entries; load_state_dict copies values onto the model's device anyway. Anything else (e.g. per-job
+    workspace files) goes straight to torch.load. Only the loaded objects are
+    kept: the scripts still rebuild their networks on every run.
+    load_state_dict copies values into the model, so sharing the loaded tensors is safe.
+    """
+    original_load = torch.load
+    default_map_location = map_location
+    cache_roots = tuple(os.path.join(os.path.realpath(root), '') for root in cache_roots)
+    cache = {}
+
+    @functools.wraps(original_load)
+    def patched_load(f, map_location=None, *args, **kwargs):
+        if map_location is None:
+            map_location = default_map_location
+        if not isinstance(f, (str, os.PathLike)) or args or kwargs:
+            return original_load(f, map_location, *args, **kwargs)
+        path = os.path.realpath(f)
+        if not cache_checkpoints or not path.startswith(cache_roots):
+            return load(path, map_location)
+        mtime = os.path.getmtime(path)
+        if path not in cache or cache[path][0] != mtime:
+            cache[path] = (mtime, load(path, map_location))
+        return cache[path][1]
+
+    def load(path, map_location):
+        if mmap and zipfile.is_zipfile(path):
+            return original_load(path, map_location, mmap=True)
+        return original_load(path, map_location)
+
+    torch.load = patched_load
+
+
+RSS_SAMPLE_SECONDS = 0.02
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_mb():
+    """Resident set size of this process right now; None where /proc isn't available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssSampler:
+    """
+    Samples this process's RSS every RSS_SAMPLE_SECONDS while the block runs.
+    `usage()` gives the highest RSS seen (peakRssMb) and how far it rose above
+    the RSS at entry (rssGrowthMb), or None for both where RSS can't be read.
+    Spikes shorter than the sampling interval can be missed.
+    """
+
+    def __enter__(self):
+        self.start = self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self._record()
+
+    def _record(self):
+        rss = current_rss_mb()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._record()
+        return False
+
+    def usage(self):
+        if self.start is None:
+            return {"peakRssMb": None, "rssGrowthMb": None}
+        return {"peakRssMb": self.peak, "rssGrowthMb": self.peak - self.start}
+
+
+def run_script(script_path, args, cwd):
+    """
+    Execute a viton_model script as `python <script> <args>` would, but inside
+    this warm interpreter. Modules the script imports stay cached between runs.
+    Job workspaces symlink the scripts, so resolve them to one stable location.
+    Returns the run's CPU seconds and the worker's RSS peak and growth during the run.
+    """
+    script_path = os.path.realpath(script_path)
+    script_dir = os.path.dirname(script_path)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+
+    previous_cwd, previous_argv = os.getcwd(), sys.argv
+    os.chdir(cwd)
+    sys.argv = [script_path] + [str(arg) for arg in args]
+    cpu_start = time.process_time()
+    try:
+        with RssSampler() as rss:
+            runpy.run_path(script_path, run_name='__main__')
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise RuntimeError(f"{os.path.basename(script_path)} exited with status {e.code}")
+    finally:
+        sys.argv = previous_argv
+        os.chdir(previous_cwd)
+    return {"cpu": time.process_time() - cpu_start, **rss.usage()}
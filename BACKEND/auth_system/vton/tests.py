@@ -1,3 +1,342 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .compositing import BACKDROP_VALUE, composite_person, frame_buffers, person_on_backdrop
+from .engine import Stage, critical_path, run_dag
+from .jobs import recover_stale_jobs
+from .models import ClothImage, VTONJob
+from .weights import WEIGHTS, WeightFile, WeightStore, WeightStoreError, sha256_of
+from .stage_worker import _patch_torch_load
+
+
+class RecordingStages:
+    """Builds stages that log when they start and finish, optionally failing."""
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def stage(self, name, deps=(), fail=False):
+        def func(ctx):
+            with self._lock:
+                self.events.append(("start", name))
+            if fail:
+                raise ValueError(f"{name} failed")
+            with self._lock:
+                self.events.append(("end", name))
+        return Stage(name, func, deps=deps)
+
+    def position(self, kind, name):
+        return self.events.index((kind, name))
+
+    def ran(self):
+        return {name for kind, name in self.events if kind == "start"}
+
+
+@override_settings(VTON_STAGE_THREADS=4)
+class RunDagTests(SimpleTestCase):
+    def test_stages_start_after_their_dependencies_finish(self):
+        recorder = RecordingStages()
+        stages = [
+            recorder.stage("prepare"),
+            recorder.stage("pose", deps=["prepare"]),
+            recorder.stage("segment", deps=["prepare"]),
+            recorder.stage("generate", deps=["pose", "segment"]),
+        ]
+        ctx = run_dag(stages, {})
+
+        for stage in stages:
+            for dep in stage.deps:
+                self.assertLess(recorder.position("end", dep), recorder.position("start", stage.name))
+        self.assertEqual(set(ctx['timings']['stages']), {"prepare", "pose", "segment", "generate"})
+
+    def test_done_stages_are_skipped(self):
+        recorder = RecordingStages()
+        stages = [recorder.stage("prepare"), recorder.stage("pose", deps=["prepare"])]
+        ctx = run_dag(stages, {}, done={"prepare"})
+
+        self.assertEqual(recorder.ran(), {"pose"})
+        self.assertEqual(set(ctx['timings']['stages']), {"pose"})
+
+    def test_stages_skipped_at_run_time_finish_without_running(self):
+        recorder = RecordingStages()
+        check = Stage("check", lambda ctx: ctx['skipped'].update({"pose", "segment"}), deps=["prepare"])
+        stages = [
+            recorder.stage("prepare"),
+            check,
+            recorder.stage("pose", deps=["check"]),
+            recorder.stage("segment", deps=["pose"]),
+            recorder.stage("cloth"),
+            recorder.stage("generate", deps=["segment", "cloth"]),
+        ]
+        reports = []
+        ctx = run_dag(stages, {}, on_stage=lambda name, finished: reports.append((name, finished)))
+
+        self.assertEqual(recorder.ran(), {"prepare", "cloth", "generate"})
+        self.assertIn(("pose", True), reports)
+        self.assertNotIn(("pose", False), reports)
+        self.assertNotIn("segment", ctx['timings']['stages'])
+
+    def test_failure_stops_dependents_and_propagates(self):
+        recorder = RecordingStages()
+        stages = [
+            recorder.stage("prepare"),
+            recorder.stage("pose", deps=["prepare"], fail=True),
+            recorder.stage("generate", deps=["pose"]),
+        ]
+        with self.assertRaisesMessage(ValueError, "pose failed"):
+            run_dag(stages, {})
+        self.assertNotIn("generate", recorder.ran())
+
+    def test_unsatisfiable_dependencies_raise(self):
+        recorder = RecordingStages()
+        with self.assertRaises(RuntimeError):
+            run_dag([recorder.stage("generate", deps=["missing"])], {})
+
+    def test_on_stage_reports_start_and_finish(self):
+        recorder = RecordingStages()
+        reports = []
+        run_dag([recorder.stage("prepare")], {}, on_stage=lambda name, finished: reports.append((name, finished)))
+        self.assertEqual(reports, [("prepare", False), ("prepare", True)])
+
+
+class CriticalPathTests(SimpleTestCase):
+    STAGES = [
+        Stage("prepare"),
+        Stage("pose", deps=["prepare"]),
+        Stage("segment", deps=["prepare"]),
+        Stage("generate", deps=["pose", "segment"]),
+    ]
+
+    def test_follows_the_dependency_that_finished_last(self):
+        timings = {
+            "prepare": {"end": 1.0},
+            "pose": {"end": 2.0},
+            "segment": {"end": 5.0},
+            "generate": {"end": 7.0},
+        }
+        self.assertEqual(critical_path(self.STAGES, timings), ["prepare", "segment", "generate"])
+
+    def test_stages_that_did_not_run_are_skipped(self):
+        # prepare was restored from a cache, so only the stages that ran are on the path
+        timings = {"pose": {"end": 3.0}, "segment": {"end": 1.0}, "generate": {"end": 4.0}}
+        self.assertEqual(critical_path(self.STAGES, timings), ["pose", "generate"])
+
+    def test_empty_timings(self):
+        self.assertEqual(critical_path(self.STAGES, {}), [])
+
+
+def synthetic_frame(seed=0, shape=(64, 48)):
+    """A photo with some zero-valued channels, and a mask with soft (non-255) values."""
+    rng = np.random.default_rng(seed)
+    ori_img = rng.integers(0, 256, size=shape + (3,), dtype=np.uint8)
+    ori_img[rng.random(shape + (3,)) < 0.1] = 0
+    mask_img = np.where(rng.random(shape) < 0.5, rng.integers(1, 256, size=shape), 0).astype(np.uint8)
+    return ori_img, mask_img
+
+
+class CompositingTests(SimpleTestCase):
+    """The fused compositing must match the bitwise_and/subtract/add steps it replaced."""
+
+    def test_person_on_backdrop_matches_the_old_formula(self):
+        ori_img, mask_img = synthetic_frame()
+        img_seg = cv2.bitwise_and(ori_img, ori_img, mask=mask_img)
+        expected = np.where(img_seg == 0, BACKDROP_VALUE, img_seg)
+
+        out = np.empty_like(ori_img)
+        np.testing.assert_array_equal(person_on_backdrop(ori_img, mask_img, out), expected)
+
+    def test_composite_person_matches_the_old_formula(self):
+        ori_img, mask_img = synthetic_frame(seed=1)
+        generated, _ = synthetic_frame(seed=2)
+        back_ground = ori_img - cv2.bitwise_and(ori_img, ori_img, mask=mask_img)
+        expected = cv2.bitwise_and(generated, generated, mask=mask_img) + back_ground
+
+        out = np.empty_like(ori_img)
+        np.testing.assert_array_equal(composite_person(generated, ori_img, mask_img, out), expected)
+
+    def test_composite_person_does_not_wrap_around(self):
+        ori_img = np.full((4, 4, 3), 200, dtype=np.uint8)
+        generated = np.full((4, 4, 3), 100, dtype=np.uint8)
+        mask_img = np.zeros((4, 4), dtype=np.uint8)
+        mask_img[:2] = 255
+
+        out = composite_person(generated, ori_img, mask_img, np.empty_like(ori_img))
+        self.assertTrue((out[:2] == 100).all())
+        self.assertTrue((out[2:] == 200).all())
+
+    def test_frame_buffers_are_reused_per_shape(self):
+        with frame_buffers.borrow((8, 8, 3)) as first:
+            pass
+        with frame_buffers.borrow((8, 8, 3)) as second:
+            self.assertIs(first, second)
+        with frame_buffers.borrow((8, 9, 3)) as other:
+            self.assertIsNot(first, other)
+
+
+class CheckpointCacheTests(SimpleTestCase):
+    """The stage workers' torch.load cache, exercised with a stand-in for torch."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.weights_dir = os.path.join(directory.name, "weights")
+        self.workspace_dir = os.path.join(directory.name, "workspace")
+        os.makedirs(self.weights_dir)
+        os.makedirs(self.workspace_dir)
+        self.loads = []
+        self.torch = SimpleNamespace(load=self.fake_load)
+        _patch_torch_load(self.torch, True, map_location='cpu', cache_roots=[self.weights_dir])
+
+    def fake_load(self, f, map_location=None, **kwargs):
+        self.loads.append(f)
+        return object()
+
+    def checkpoint(self, directory, name="gen.pth"):
+        path = os.path.join(directory, name)
+        with open(path, 'wb') as f:
+            f.write(b"not a zip checkpoint")
+        return path
+
+    def test_fresh_lambda_map_locations_share_one_entry(self):
+        path = self.checkpoint(self.weights_dir)
+        first = self.torch.load(path, map_location=lambda storage, loc: storage)
+        second = self.torch.load(path, map_location=lambda storage, loc: storage)
+        self.assertIs(first, second)
+        self.assertEqual(len(self.loads), 1)
+
+    def test_files_outside_the_weight_store_are_not_cached(self):
+        path = self.checkpoint(self.workspace_dir, "output.pth")
+        self.torch.load(path)
+        self.torch.load(path)
+        self.assertEqual(len(self.loads), 2)
+
+    def test_changed_checkpoint_replaces_its_entry(self):
+        path = self.checkpoint(self.weights_dir)
+        first = self.torch.load(path)
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNot(self.torch.load(path), first)
+        self.assertEqual(len(self.loads), 2)
+
+
+@override_settings(VTON_JOB_LEASE_SECONDS=60, VTON_JOB_MAX_ATTEMPTS=2)
+class JobLeaseRecoveryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("lease@example.com", "Lease", "Test", password="x")
+
+    def running_job(self, heartbeat_age, attempts=1):
+        heartbeat_at = None if heartbeat_age is None else timezone.now() - timedelta(seconds=heartbeat_age)
+        return VTONJob.objects.create(
+            user=self.user, status='running', worker="vton-host:7:0a1b2c3d", heartbeat_at=heartbeat_at,
+            attempts=attempts, stage="pose", completed_stages=["prepare_human"],
+        )
+
+    def test_job_with_a_stale_lease_is_requeued(self):
+        # A restarted container can reuse the hostname and pid; only the lease age matters
+        job = self.running_job(heartbeat_age=300)
+        self.assertEqual(recover_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual((job.worker, job.stage, job.completed_stages, job.heartbeat_at), ('', '', [], None))
+
+    def test_job_without_a_heartbeat_is_requeued(self):
+        job = self.running_job(heartbeat_age=None)
+        recover_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+
+    def test_job_with_a_live_lease_is_left_running(self):
+        job = self.running_job(heartbeat_age=5)
+        self.assertEqual(recover_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_job_out_of_attempts_is_failed(self):
+        job = self.running_job(heartbeat_age=300, attempts=2)
+        recover_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+
+class WeightStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model_dir = os.path.join(directory.name, "viton_model")
+        os.makedirs(self.model_dir)
+        self.store = WeightStore(os.path.join(directory.name, "weights"), self.model_dir)
+
+        self.source = os.path.join(self.model_dir, "model.pth")
+        self.write_source(b"genuine checkpoint")
+        weight = WeightFile('test', 'model.pth', source='model.pth', sha256_prefix=sha256_of(self.source)[:6])
+        patcher = mock.patch.dict(WEIGHTS, {'test': weight, 'remote': WeightFile('remote', 'remote.pkl', url="https://example.invalid/x.pkl")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_source(self, data):
+        with open(self.source, 'wb') as f:
+            f.write(data)
+
+    def test_sha256_prefix_rejects_a_tampered_file(self):
+        self.write_source(b"tampered checkpoint")
+        with self.assertRaisesMessage(WeightStoreError, "expected"):
+            self.store.fetch('test')
+        self.assertFalse(self.store.stored('test'))
+        self.assertEqual(os.listdir(self.store.root), [])
+
+    def test_fetched_file_is_recorded_and_verifies(self):
+        path = self.store.fetch('test')
+        self.assertTrue(self.store.stored('test'))
+        self.assertEqual(self.store.path('test'), path)
+        self.assertEqual(self.store.verify('test')[0], True)
+
+    def test_missing_entry_never_falls_back_to_a_download(self):
+        # Checkout files may stand in until the store is filled; URLs never do
+        self.assertEqual(self.store.path('test'), self.source)
+        with self.assertRaises(WeightStoreError):
+            self.store.path('remote')
+
+
+class ContentHashedUploadTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self):
+        return ClothImage.from_upload(SimpleUploadedFile("shirt.png", b"same bytes"))
+
+    def stored_files(self, instance):
+        return os.listdir(os.path.dirname(instance.image.path))
+
+    def test_same_bytes_share_one_row_and_file(self):
+        first = self.upload()
+        self.assertEqual(self.upload().id, first.id)
+        self.assertEqual(self.stored_files(first), [os.path.basename(first.image.name)])
+
+    def test_losing_a_concurrent_upload_deletes_its_file(self):
+        winner = self.upload()
+        storage = ClothImage._meta.get_field('image').storage
+        exists = storage.exists
+        # Miss the winner's row and file, as a request racing it would; storage then
+        # writes this request's copy under a new name
+        checks = iter([False])
+        with mock.patch.object(ClothImage.objects, 'filter', return_value=ClothImage.objects.none()), \
+                mock.patch.object(storage, 'exists', lambda name: next(checks, None) or exists(name)):
+            self.assertEqual(self.upload().id, winner.id)
+        self.assertEqual(self.stored_files(winner), [os.path.basename(winner.image.name)])
@@ -1,10 +1,20 @@
 # urls.py (Update to include VTON history endpoint)
 from django.urls import path
-from .views import UploadClothImage, UploadHumanImage, PerformVirtualTryOn, VTONHistoryView
+from .views import (
+    UploadClothImage, UploadHumanImage, PerformVirtualTryOn, PerformBatchVirtualTryOn, VTONHistoryView,
+    SubmitVirtualTryOnJob, VirtualTryOnJobStatus, VirtualTryOnJobResult, VirtualTryOnJobFullResolution,
+    VTONMetricsView
+)
 
 urlpatterns = [
     path('upload-cloth/', UploadClothImage.as_view(), name='upload-cloth'),
     path('upload-human/', UploadHumanImage.as_view(), name='upload-human'),
     path('virtual-try-on/', PerformVirtualTryOn.as_view(), name='virtual-try-on'),
+    path('virtual-try-on/batch/', PerformBatchVirtualTryOn.as_view(), name='virtual-try-on-batch'),
     path('vton-history/', VTONHistoryView.as_view(), name='vton-history'),
+    path('virtual-try-on/jobs/', SubmitVirtualTryOnJob.as_view(), name='vton-job-submit'),
+    path('virtual-try-on/jobs/<uuid:job_id>/', VirtualTryOnJobStatus.as_view(), name='vton-job-status'),
+    path('virtual-try-on/jobs/<uuid:job_id>/result/', VirtualTryOnJobResult.as_view(), name='vton-job-result'),
+    path('virtual-try-on/jobs/<uuid:job_id>/full/', VirtualTryOnJobFullResolution.as_view(), name='vton-job-full'),
+    path('metrics/', VTONMetricsView.as_view(), name='vton-metrics'),
 ]
\ No newline at end of file
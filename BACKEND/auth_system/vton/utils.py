@@ -1,28 +1,73 @@
 import os
+from io import BytesIO
+
 from django.conf import settings
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
 
-def save_temp_file(uploaded_file, image_type="cloth"):
+def save_temp_file(uploaded_file, directory, image_type="cloth", index=0):
     """
-    Save uploaded image to viton_model/static/ with specific filenames.
+    Save uploaded image into a try-on job's static/ folder with specific filenames.
     :param uploaded_file: The uploaded file object.
+    :param directory: The job workspace root (see workspace.Workspace).
     :param image_type: 'cloth' or 'human' to determine filename.
+    :param index: Position of a cloth in a multi-cloth try-on.
     :return: Absolute file path of the saved image.
     """
     # Define the target folder
-    target_folder = os.path.join(settings.BASE_DIR, 'VTON', 'viton_model', 'static')
+    target_folder = os.path.join(directory, 'static')
     os.makedirs(target_folder, exist_ok=True)
 
     # Determine filename based on image_type
     filename = 'cloth_web.jpg' if image_type == 'cloth' else 'origin_web.jpg'
+    if index:
+        filename = f"cloth_web_{index}.jpg"
     file_path = os.path.join(target_folder, filename)
 
-    # Remove existing file if it exists
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
     # Save the uploaded file
     with open(file_path, 'wb+') as destination:
         for chunk in uploaded_file.chunks():
             destination.write(chunk)
 
-    return file_path
\ No newline at end of file
+    return file_path
+
+# Formats the try-on stages can read, as Pillow reports them from the file header.
+# Many phone cameras write JPEGs with an extra preview frame, which Pillow calls MPO.
+SUPPORTED_IMAGE_FORMATS = {"JPEG", "MPO", "PNG"}
+
+
+class InspectedImage:
+    """An upload whose header has been checked; `data` holds its bytes, read once."""
+
+    def __init__(self, upload, data, image):
+        self.upload = upload
+        self.data = data
+        self.format = image.format
+        self.width, self.height = image.size
+
+
+def inspect_upload(upload, expected_type):
+    """
+    Validate an uploaded image from its size and header alone, before any full
+    decode: reject files over VTON_MAX_UPLOAD_BYTES, formats other than JPEG/PNG
+    and images over VTON_MAX_IMAGE_PIXELS. Raises ValidationError.
+    """
+    if upload.size > settings.VTON_MAX_UPLOAD_BYTES:
+        raise ValidationError(f"The {expected_type} image is larger than {settings.VTON_MAX_UPLOAD_BYTES // 2 ** 20} MB.")
+
+    upload.seek(0)
+    data = upload.read()
+    try:
+        image = Image.open(BytesIO(data))  # Parses the header only
+    except Image.DecompressionBombError:
+        raise ValidationError(f"The {expected_type} image is too large.")
+    except (UnidentifiedImageError, OSError):
+        raise ValidationError("Invalid image file.")
+
+    if image.format not in SUPPORTED_IMAGE_FORMATS:
+        raise ValidationError(f"Invalid {expected_type} image. Please upload a PNG, JPG, or JPEG image.")
+    width, height = image.size
+    if width * height > settings.VTON_MAX_IMAGE_PIXELS:
+        raise ValidationError(f"The {expected_type} image is too large ({width}x{height}).")
+    return InspectedImage(upload, data, image)
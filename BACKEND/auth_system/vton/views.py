@@ -1,35 +1,30 @@
 # views.py (Fixed to handle serializer validation and add debugging)
-from PIL import Image
 from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework import status
-from .models import ClothImage, HumanImage, VTONHistory
-from .serializers import ClothImageSerializer, HumanImageSerializer, VTONHistorySerializer
+from .models import ClothImage, HumanImage, VTONHistory, VTONJob
+from .serializers import ClothImageSerializer, HumanImageSerializer, VTONHistorySerializer, VTONJobSerializer
 from rest_framework.permissions import IsAuthenticated
-from .utils import save_temp_file
-from .viton_pipeline import run_virtual_tryon_pipeline
-import os
+from .jobs import execute_tryon, job_queue, TryOnError, QueueFull
+from .utils import inspect_upload
+from .viton_pipeline import QUALITY_TIERS, human_cache, cloth_cache, result_cache
+from .metrics import histogram, mean, recent_job_metrics, values_of
 from django.conf import settings
-import shutil
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 import logging
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-def validate_image_type(image, expected_type):
-    valid_extensions = {"png", "jpg", "jpeg"}
-    file_extension = image.name.split('.')[-1].lower()
-
-    if file_extension not in valid_extensions:
-        raise ValidationError(f"Invalid {expected_type} image. Please upload a PNG, JPG, or JPEG image.")
-    
-    try:
-        img = Image.open(image)
-        img.verify()
-    except Exception:
-        raise ValidationError("Invalid image file.")
+def requested_quality(request):
+    """The try-on quality tier asked for: 'preview' renders fast at low resolution, 'full' (default) at 768x1024."""
+    quality = request.data.get('quality', 'full')
+    if quality not in QUALITY_TIERS:
+        raise ValidationError(f"Invalid quality. Choose one of: {', '.join(QUALITY_TIERS)}.")
+    return quality
 
 class UploadClothImage(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -37,17 +32,18 @@ class UploadClothImage(APIView):
 
     def post(self, request, *args, **kwargs):
         logger.debug(f"UploadClothImage received data: {request.FILES}")
-        serializer = ClothImageSerializer(data=request.data)
-        if serializer.is_valid():
-            try:
-                validate_image_type(request.FILES['image'], "cloth")
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            except ValidationError as e:
-                logger.error(f"Validation error in UploadClothImage: {str(e)}")
-                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        logger.error(f"Serializer errors in UploadClothImage: {serializer.errors}")
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        image = request.FILES.get('image')
+        if not image:
+            return Response({"error": "An image file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            inspected = inspect_upload(image, "cloth")
+        except ValidationError as e:
+            logger.error(f"Validation error in UploadClothImage: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Repeat uploads of the same bytes return the existing image
+        instance = ClothImage.from_upload(image, data=inspected.data)
+        return Response(ClothImageSerializer(instance).data, status=status.HTTP_201_CREATED)
 
 class UploadHumanImage(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -55,17 +51,18 @@ class UploadHumanImage(APIView):
 
     def post(self, request, *args, **kwargs):
         logger.debug(f"UploadHumanImage received data: {request.FILES}")
-        serializer = HumanImageSerializer(data=request.data)
-        if serializer.is_valid():
-            try:
-                validate_image_type(request.FILES['image'], "human")
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            except ValidationError as e:
-                logger.error(f"Validation error in UploadHumanImage: {str(e)}")
-                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        logger.error(f"Serializer errors in UploadHumanImage: {serializer.errors}")
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        image = request.FILES.get('image')
+        if not image:
+            return Response({"error": "An image file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            inspected = inspect_upload(image, "human")
+        except ValidationError as e:
+            logger.error(f"Validation error in UploadHumanImage: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Repeat uploads of the same bytes return the existing image
+        instance = HumanImage.from_upload(image, data=inspected.data)
+        return Response(HumanImageSerializer(instance).data, status=status.HTTP_201_CREATED)
 
 class PerformVirtualTryOn(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -83,55 +80,173 @@ class PerformVirtualTryOn(APIView):
 
         # Validate image types first
         try:
-            validate_image_type(cloth_image, "cloth")
-            validate_image_type(human_image, "human")
+            inspected_cloth = inspect_upload(cloth_image, "cloth")
+            inspected_human = inspect_upload(human_image, "human")
+            quality = requested_quality(request)
         except ValidationError as e:
             logger.error(f"Image validation error: {str(e)}")
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         # Save images directly to models, bypassing strict serializer validation
         try:
-            cloth_instance = ClothImage.objects.create(image=cloth_image)
-            human_instance = HumanImage.objects.create(image=human_image)
+            cloth_instance = ClothImage.from_upload(cloth_image, data=inspected_cloth.data)
+            human_instance = HumanImage.from_upload(human_image, data=inspected_human.data)
         except Exception as e:
             logger.error(f"Error saving images to database: {str(e)}")
             return Response({"error": f"Failed to save images: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        cloth_path = save_temp_file(cloth_image, image_type="cloth")
-        human_path = save_temp_file(human_image, image_type="human")
-        logger.debug(f"Temp files saved: cloth={cloth_path}, human={human_path}")
+        try:
+            vton_histories, _ = execute_tryon(request.user, [cloth_instance], human_instance, quality=quality)
+        except TryOnError as e:
+            logger.error(str(e))
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception as e:
+            logger.error(f"Pipeline error: {str(e)}")
+            return Response({"error": f"Pipeline error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        logger.debug(f"VTONHistory saved: user={request.user.id}, cloth={cloth_instance.id}, human={human_instance.id}")
+
+        result_url = request.build_absolute_uri(vton_histories[0].generated_image.url)
+        logger.debug(f"Result URL: {result_url}")
+        return Response({"result": result_url}, status=status.HTTP_200_OK)
+
+class PerformBatchVirtualTryOn(APIView):
+    """Try several cloths on one person: human stages run once, the generator once for all cloths."""
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        cloth_images = request.FILES.getlist('clothImages')
+        human_image = request.FILES.get('humanImage')
+
+        if not cloth_images or not human_image:
+            return Response({"error": "A human image and at least one cloth image are required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(cloth_images) > settings.VTON_MAX_BATCH_CLOTHS:
+            return Response({"error": f"At most {settings.VTON_MAX_BATCH_CLOTHS} cloth images per request."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            output_path = run_virtual_tryon_pipeline(human_path, cloth_path)
-            logger.debug(f"Pipeline output: {output_path}")
-            if not output_path or not os.path.exists(output_path):
-                error_msg = "Virtual try-on pipeline failed to generate output."
-                logger.error(error_msg)
-                return Response({"error": error_msg}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            inspected_cloths = [inspect_upload(cloth_image, "cloth") for cloth_image in cloth_images]
+            inspected_human = inspect_upload(human_image, "human")
+            quality = requested_quality(request)
+        except ValidationError as e:
+            logger.error(f"Image validation error: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cloth_instances = [ClothImage.from_upload(inspected.upload, data=inspected.data) for inspected in inspected_cloths]
+            human_instance = HumanImage.from_upload(human_image, data=inspected_human.data)
+        except Exception as e:
+            logger.error(f"Error saving images to database: {str(e)}")
+            return Response({"error": f"Failed to save images: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            vton_histories, _ = execute_tryon(request.user, cloth_instances, human_instance, quality=quality)
+        except TryOnError as e:
+            logger.error(str(e))
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
             logger.error(f"Pipeline error: {str(e)}")
             return Response({"error": f"Pipeline error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Copy the generated image to media/vton_results/
-        result_filename = f"vton_result_{request.user.id}_{int(cloth_instance.uploaded_at.timestamp())}.png"
-        media_result_path = os.path.join(settings.MEDIA_ROOT, 'vton_results', result_filename)
-        os.makedirs(os.path.dirname(media_result_path), exist_ok=True)
-        shutil.copy(output_path, media_result_path)
-        logger.debug(f"Generated image copied to: {media_result_path}")
+        return Response({
+            "results": [
+                {
+                    "clothImageId": vton_history.cloth_image_id,
+                    "result": request.build_absolute_uri(vton_history.generated_image.url),
+                }
+                for vton_history in vton_histories
+            ],
+        }, status=status.HTTP_200_OK)
 
-        # Save VTON history
-        result_url = request.build_absolute_uri("/static/finalimg.png")
-        logger.debug(f"Result URL: {result_url}")
-        vton_history = VTONHistory(
+class SubmitVirtualTryOnJob(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        cloth_image = request.FILES.get('clothImage')
+        human_image = request.FILES.get('humanImage')
+
+        if not cloth_image or not human_image:
+            return Response({"error": "Both cloth and human images are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            inspected_cloth = inspect_upload(cloth_image, "cloth")
+            inspected_human = inspect_upload(human_image, "human")
+            quality = requested_quality(request)
+        except ValidationError as e:
+            logger.error(f"Image validation error: {str(e)}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cloth_instance = ClothImage.from_upload(cloth_image, data=inspected_cloth.data)
+            human_instance = HumanImage.from_upload(human_image, data=inspected_human.data)
+        except Exception as e:
+            logger.error(f"Error saving images to database: {str(e)}")
+            return Response({"error": f"Failed to save images: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = VTONJob.objects.create(
             user=request.user,
             cloth_image=cloth_instance,
             human_image=human_instance,
-            generated_image=os.path.join('vton_results', result_filename)
+            quality=quality,
         )
-        vton_history.save()
-        logger.debug(f"VTONHistory saved: user={request.user.id}, cloth={cloth_instance.id}, human={human_instance.id}")
+        return submit_job(request, job)
 
-        return Response({"result": result_url}, status=status.HTTP_200_OK)
+def submit_job(request, job):
+    try:
+        job_queue.submit(job)
+    except QueueFull as e:
+        return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response({
+        "jobId": job.id,
+        "status": job.status,
+        "quality": job.quality,
+        "statusUrl": request.build_absolute_uri(reverse('vton-job-status', args=[job.id])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+class VirtualTryOnJobFullResolution(APIView):
+    """Queue the full-resolution render of a preview job; its human-side work is reused from the cache."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, job_id, *args, **kwargs):
+        preview = get_object_or_404(VTONJob, id=job_id, user=request.user)
+        if preview.quality == 'full':
+            return Response({"error": "This try-on is already full resolution."}, status=status.HTTP_400_BAD_REQUEST)
+        if preview.cloth_image is None or preview.human_image is None:
+            return Response({"error": "Input images were deleted."}, status=status.HTTP_410_GONE)
+
+        job = VTONJob.objects.create(
+            user=request.user,
+            cloth_image=preview.cloth_image,
+            human_image=preview.human_image,
+            quality='full',
+        )
+        return submit_job(request, job)
+
+class VirtualTryOnJobStatus(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(VTONJob, id=job_id, user=request.user)
+        data = VTONJobSerializer(job).data
+        if job.status == 'queued':
+            data['queueDepth'] = job_queue.depth()
+        return Response(data, status=status.HTTP_200_OK)
+
+class VirtualTryOnJobResult(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(VTONJob.objects.select_related('history'), id=job_id, user=request.user)
+        if job.status == 'failed':
+            return Response({"status": job.status, "error": job.error}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if job.status != 'done' or job.history is None:
+            return Response({"status": job.status, "error": "Try-on is not finished yet."}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            "status": job.status,
+            "quality": job.quality,
+            "result": request.build_absolute_uri(job.history.generated_image.url),
+        }, status=status.HTTP_200_OK)
 
 class VTONHistoryView(APIView):
     permission_classes = [IsAuthenticated]
@@ -140,4 +255,35 @@ class VTONHistoryView(APIView):
         logger.debug(f"Fetching VTON history for user: {request.user.id}")
         vton_records = VTONHistory.objects.filter(user=request.user)[:3]
         serializer = VTONHistorySerializer(vton_records, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class VTONMetricsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        per_stage, totals, critical, jobs = recent_job_metrics(settings.VTON_METRICS_WINDOW)
+        stages = {}
+        for stage_name, metrics_list in per_stage.items():
+            input_bytes = values_of(metrics_list, 'inputBytes')
+            output_bytes = values_of(metrics_list, 'outputBytes')
+            stages[stage_name] = {
+                "wallSeconds": histogram(values_of(metrics_list, 'wall')),
+                "cpuSeconds": histogram(values_of(metrics_list, 'cpu')),
+                "peakRssMb": max(values_of(metrics_list, 'peakRssMb'), default=None),
+                "maxRssGrowthMb": max(values_of(metrics_list, 'rssGrowthMb'), default=None),
+                "meanInputBytes": round(mean(input_bytes)) if input_bytes else None,
+                "meanOutputBytes": round(mean(output_bytes)) if output_bytes else None,
+                "onCriticalPath": critical[stage_name],
+            }
+
+        return Response({
+            "caches": {
+                "human": human_cache.stats(),
+                "cloth": cloth_cache.stats(),
+                "result": result_cache.stats(),
+            },
+            "queueDepth": job_queue.depth(),
+            "jobs": jobs,
+            "jobSeconds": histogram(totals),
+            "stages": stages,
+        }, status=status.HTTP_200_OK)
@@ -1,102 +1,302 @@
-import subprocess
 import os
 import cv2
 import numpy as np
 import glob
 import shutil
-import sys
+from django.conf import settings
+from .engine import Stage, ScriptStage, critical_path, run_dag
+from .cache import DiskArtifactCache, content_hash
+from .compositing import composite_person, encode_png, frame_buffers, person_on_backdrop
+from .weights import weight_store
 
-def run_virtual_tryon_pipeline(human_image_path, cloth_image_path):
-    static_folder = "./VTON/viton_model/static"
+DENSEPOSE_CONFIG = "detectron2/projects/DensePose/configs/densepose_rcnn_R_50_FPN_s1x.yaml"
 
-    # Step 1: Save original human image
-    ori_img = cv2.imread(human_image_path)
+# Graphonomy writes its segmentation straight into the workspace root, where
+# get_seg_grayscale.py reads it; segment_human keeps the decoded mask in memory.
+SEGMENTATION_FILE = "resized_segmentation_img.png"
+# Lossless and cheap to encode; only Graphonomy reads it
+GRAPHONOMY_INPUT = "resized_img.png"
+PNG_FAST = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+HR_VITON_DATA_DIR = os.path.join("HR-VITON-main", "test", "test")
+
+# HR-VITON data-list names: one person, and one entry per cloth in a batch.
+# Cloth names differ from the person's so each generator output names its cloth.
+PERSON_NAME = "00001_00.jpg"
+
+# Generator output size (width, height) per quality tier. Previews render at half
+# resolution for a fast first result; "full" matches the 768x1024 human pipeline.
+QUALITY_TIERS = {
+    "preview": (384, 512),
+    "full": (768, 1024),
+}
+USE_CUDA = settings.VTON_DEVICE == 'cuda'
+
+def cloth_name(index):
+    return f"{index + 1:05d}_01.jpg"
+
+def hr_viton_data(*names):
+    return [os.path.join(HR_VITON_DATA_DIR, name) for name in names]
+
+# Step 1: Save original human image
+def prepare_human(ctx):
+    ori_img = cv2.imread(ctx['human_image_path'])
     ori_img = cv2.resize(ori_img, (768, 1024))
-    cv2.imwrite("./VTON/viton_model/origin.jpg", ori_img)
+    cv2.imwrite(os.path.join(ctx['root'], "origin.jpg"), ori_img)
 
     # Also create resized image for Graphonomy
     img = cv2.resize(ori_img, (384, 512))
-    cv2.imwrite("./VTON/viton_model/resized_img.jpg", img)
+    cv2.imwrite(os.path.join(ctx['root'], GRAPHONOMY_INPUT), img, PNG_FAST)
+    ctx['ori_img'] = ori_img
+    # Human-side artifacts are cached under the normalized image, not the upload bytes
+    ctx['human_key'] = content_hash(ori_img.tobytes())
 
-    # Step 2: Generate cloth mask
-    subprocess.run([sys.executable, "get_cloth_mask.py", cloth_image_path], cwd="./VTON/viton_model", check=True)
-
-    # Step 3: Run pose estimation
-    subprocess.run([sys.executable, "posenet.py"], cwd="./VTON/viton_model", check=True)
-
-    # Step 4: Graphonomy segmentation
-    output_graphonomy_dir = "./VTON/viton_model/output_graphonomy/"
-    os.makedirs(output_graphonomy_dir, exist_ok=True)
-
-    subprocess.run([
-        sys.executable, "exp/inference/inference.py",
-        "--loadmodel", "inference.pth",
-        "--img_path", "../resized_img.jpg",
-        "--output_path", "../output_graphonomy/",
-        "--output_name", "resized_segmentation_img"
-    ], cwd="./VTON/viton_model/Graphonomy-master", check=True)
-
-    # Copy output segmentation
-    seg_img_path_src = os.path.join(output_graphonomy_dir, "resized_segmentation_img.png")
-    seg_img_path_dst = "./VTON/viton_model/resized_segmentation_img.png"
-    shutil.copy(seg_img_path_src, seg_img_path_dst)
-
-    # Step 5: Process segmentation mask
-    mask_img = cv2.imread(seg_img_path_src, cv2.IMREAD_GRAYSCALE)
+# Step 5: Process segmentation mask, then Step 6: HR-VITON image preparation
+def segment_human(ctx):
+    ori_img = ctx['ori_img']
+    mask_img = cv2.imread(os.path.join(ctx['root'], SEGMENTATION_FILE), cv2.IMREAD_GRAYSCALE)
     mask_img = cv2.resize(mask_img, (768, 1024))
     k = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
     mask_img = cv2.erode(mask_img, k)
 
-    img_seg = cv2.bitwise_and(ori_img, ori_img, mask=mask_img)
-    back_ground = ori_img - img_seg
-    img_seg = np.where(img_seg == 0, 215, img_seg)
+    # The generator reads its person image from disk; ori_img is already 768x1024
+    hr_viton_test_path = os.path.join(ctx['root'], "HR-VITON-main", "test", "test", "image")
+    os.makedirs(hr_viton_test_path, exist_ok=True)
+    with frame_buffers.borrow(ori_img.shape) as img_seg:
+        person_on_backdrop(ori_img, mask_img, img_seg)
+        cv2.imwrite(os.path.join(hr_viton_test_path, PERSON_NAME), img_seg)
+        if settings.VTON_DEBUG_DUMP:
+            cv2.imwrite(os.path.join(ctx['root'], "seg_img.png"), img_seg)
+    ctx['mask_img'] = mask_img
 
-    cv2.imwrite("./VTON/viton_model/seg_img.png", img_seg)
+# Step 2: Generate cloth masks
+def prepare_cloths(ctx):
+    """
+    Put every cloth of the batch and its mask under HR-VITON's cloth/ and
+    cloth-mask/, from the cloth cache or get_cloth_mask.py. The script always
+    writes the same file names, so cloths go through it one at a time and each
+    result is renamed to the cloth's data-list name. Returns the script runs' usage.
+    """
+    data_dir = os.path.join(ctx['root'], HR_VITON_DATA_DIR)
+    holding_dir = os.path.join(ctx['root'], "cloth_items")
+    usage = {"cpu": 0.0, "peakRssMb": None, "rssGrowthMb": None}
+    for cloth in ctx['cloths']:
+        for name in CLOTH_DATA_DIRS:
+            shutil.rmtree(os.path.join(data_dir, name), ignore_errors=True)
+            os.makedirs(os.path.join(data_dir, name))
 
-    # Step 6: HR-VITON image preparation
-    hr_viton_test_path = "./VTON/viton_model/HR-VITON-main/test/test/image/"
-    os.makedirs(hr_viton_test_path, exist_ok=True)
-    img_for_hrviton = cv2.resize(img_seg, (768, 1024))
-    cv2.imwrite(os.path.join(hr_viton_test_path, "00001_00.jpg"), img_for_hrviton)
+        # Cloth masks are keyed by the cloth file's bytes and shared across users and jobs
+        if not cloth_cache.restore(cloth['key'], lambda entry: restore_cloth_artifacts(entry, ctx)):
+            script_usage = CLOTH_MASK.run({**ctx, 'cloth_image_path': cloth['path']})
+            usage["cpu"] += script_usage["cpu"]
+            for key in ("peakRssMb", "rssGrowthMb"):
+                if script_usage[key] is not None:
+                    usage[key] = max(usage[key] or 0, script_usage[key])
+            store_cloth_artifacts(cloth['key'], ctx)
+
+        for name in CLOTH_DATA_DIRS:
+            produced = sorted(os.listdir(os.path.join(data_dir, name)))
+            if not produced:
+                raise RuntimeError(f"get_cloth_mask.py produced no {name} image for {os.path.basename(cloth['path'])}")
+            os.makedirs(os.path.join(holding_dir, name), exist_ok=True)
+            os.replace(os.path.join(data_dir, name, produced[0]), os.path.join(holding_dir, name, cloth['name']))
+
+    for name in CLOTH_DATA_DIRS:
+        shutil.rmtree(os.path.join(data_dir, name), ignore_errors=True)
+        os.replace(os.path.join(holding_dir, name), os.path.join(data_dir, name))
+    os.rmdir(holding_dir)
+    return usage
+
+def write_data_list(ctx):
+    """One generator pass covers the whole batch: a t2.txt line per cloth."""
+    with open(os.path.join(ctx['root'], "HR-VITON-main", "test", "t2.txt"), 'w') as f:
+        f.writelines(f"{PERSON_NAME} {cloth['name']}\n" for cloth in ctx['cloths'])
+
+# Step 9: Post-process, then Step 10: Final save
+def composite(ctx):
+    """Paste each generated person onto the original photo and encode it once as PNG bytes."""
+    output_dir = os.path.join(ctx['root'], "HR-VITON-main", "Output")
+    output_images = sorted(glob.glob(os.path.join(output_dir, "*.png")))
+    # The photo and mask at each output size; previews composite at the generator's resolution
+    frames = {ctx['ori_img'].shape[:2]: (ctx['ori_img'], ctx['mask_img'])}
+    ctx['results'] = []
+    for index, cloth in enumerate(ctx['cloths']):
+        cloth_stem = os.path.splitext(cloth['name'])[0]
+        matches = [path for path in output_images if cloth_stem in os.path.basename(path)]
+        img_path = matches[0] if matches else (output_images[index] if index < len(output_images) else None)
+        if img_path is None:
+            ctx['results'].append(None)
+            continue
+
+        img = cv2.imread(img_path)
+        if img.shape[:2] not in frames:
+            size = (img.shape[1], img.shape[0])
+            frames[img.shape[:2]] = (cv2.resize(ctx['ori_img'], size, interpolation=cv2.INTER_AREA),
+                                     cv2.resize(ctx['mask_img'], size, interpolation=cv2.INTER_NEAREST))
+        ori_img, mask_img = frames[img.shape[:2]]
+        with frame_buffers.borrow(img.shape) as result:
+            composite_person(img, ori_img, mask_img, result)
+            ctx['results'].append(encode_png(result))
+            if settings.VTON_DEBUG_DUMP:
+                cv2.imwrite(img_path, result)
+                cv2.imwrite(os.path.join(ctx['root'], "static", f"finalimg_{index}.png"), result)
+
+def check_human_cache(ctx):
+    """Same person as an earlier try-on: restore the human stages' outputs and skip them."""
+    ctx['human_cached'] = human_cache.restore(ctx['human_key'], lambda entry: restore_human_artifacts(entry, ctx))
+    if ctx['human_cached']:
+        ctx['skipped'].update(stage.name for stage in HUMAN_STAGES)
 
+# Stages that depend only on the human photo; their outputs are cached (see human_cache).
+# `deps` make this a graph: pose, the Graphonomy branch and the DensePose branch run side by side,
+# and the cloth branch runs beside all of them from the start.
+HUMAN_STAGES = [
+    # Step 3: Run pose estimation
+    ScriptStage("pose", "posenet.py", deps=["human_cache"],
+                inputs=["origin.jpg"], outputs=hr_viton_data("openpose_img", "openpose_json")),
+    # Step 4: Graphonomy segmentation
+    ScriptStage("graphonomy", "exp/inference/inference.py", args=[
+        "--loadmodel", lambda ctx: weight_store.path('graphonomy'),
+        "--img_path", f"../{GRAPHONOMY_INPUT}",
+        "--output_path", "../",
+        "--output_name", os.path.splitext(SEGMENTATION_FILE)[0],
+        "--use_gpu", int(USE_CUDA)
+    ], cwd="Graphonomy-master", deps=["human_cache"], inputs=[GRAPHONOMY_INPUT], outputs=[SEGMENTATION_FILE]),
+    Stage("segment_human", segment_human, deps=["graphonomy"],
+          inputs=[SEGMENTATION_FILE], outputs=hr_viton_data("image")),
     # Step 7: Preprocess
-    subprocess.run([sys.executable, "get_seg_grayscale.py"], cwd="./VTON/viton_model", check=True)
+    ScriptStage("seg_grayscale", "get_seg_grayscale.py", deps=["segment_human"],
+                inputs=[SEGMENTATION_FILE], outputs=hr_viton_data("image-parse-v3")),
+    ScriptStage("densepose", "detectron2/projects/DensePose/apply_net.py", args=[
+        "dump", DENSEPOSE_CONFIG, lambda ctx: weight_store.path('densepose'), "origin.jpg", "--output", "output.pkl", "-v",
+        "--opts", "MODEL.DEVICE", settings.VTON_DEVICE
+    ], deps=["human_cache"], inputs=["origin.jpg"], outputs=["output.pkl"]),
+    ScriptStage("densepose_image", "get_densepose.py", deps=["densepose"],
+                inputs=["output.pkl"], outputs=hr_viton_data("image-densepose")),
+]
 
-    subprocess.run([
-        sys.executable, "detectron2/projects/DensePose/apply_net.py", "dump",
-        "detectron2/projects/DensePose/configs/densepose_rcnn_R_50_FPN_s1x.yaml",
-        "https://dl.fbaipublicfiles.com/densepose/densepose_rcnn_R_50_FPN_s1x/165712039/model_final_162be9.pkl",
-        "origin.jpg", "--output", "output.pkl", "-v"
-    ], cwd="./VTON/viton_model", check=True)
+CLOTH_MASK = ScriptStage("cloth_mask", "get_cloth_mask.py", args=[lambda ctx: ctx['cloth_image_path']])
 
-    subprocess.run([sys.executable, "get_densepose.py"], cwd="./VTON/viton_model", check=True)
+CLOTH_STAGES = [
+    Stage("cloth_mask", prepare_cloths, inputs=lambda ctx: [cloth['path'] for cloth in ctx['cloths']],
+          outputs=hr_viton_data("cloth", "cloth-mask")),
+]
 
-    # Step 8: Run Generator
-    subprocess.run([
-        sys.executable, "test_generator.py",
-        "--cuda", "True",
+def generator_args(ctx):
+    fine_width, fine_height = QUALITY_TIERS[ctx['quality']]
+    args = [
         "--test_name", "test1",
-        "--tocg_checkpoint", "mtviton.pth",
-        "--gpu_ids", "0",
-        "--gen_checkpoint", "gen.pth",
+        "--tocg_checkpoint", weight_store.path('tocg'),
+        "--gen_checkpoint", weight_store.path('generator'),
         "--datasetting", "unpaired",
         "--data_list", "t2.txt",
-        "--dataroot", "./test"
-    ], cwd="./VTON/viton_model/HR-VITON-main", check=True)
+        "--dataroot", "./test",
+        "--batch-size", len(ctx['cloths']),
+        "--fine_width", fine_width,
+        "--fine_height", fine_height,
+    ]
+    # test_generator.py treats any --cuda value as true, so CPU runs leave it out
+    if USE_CUDA:
+        args += ["--cuda", "True", "--gpu_ids", "0"]
+    return args
 
-    # Step 9: Post-process
-    output_images = glob.glob("./VTON/viton_model/HR-VITON-main/Output/*.png")
-    for img_path in output_images:
-        img = cv2.imread(img_path)
-        img = cv2.bitwise_and(img, img, mask=mask_img)
-        img = img + back_ground
-        cv2.imwrite(img_path, img)
-
-    # Step 10: Final save
-    final_image_path = output_images[0] if output_images else None
-    if final_image_path:
-        final_saved_path = os.path.join(static_folder, "finalimg.png")
-        cv2.imwrite(final_saved_path, cv2.imread(final_image_path))
-        return final_saved_path
-
-    return None
+TRYON_STAGES = [
+    # Step 8: Run Generator
+    ScriptStage("generator", "test_generator.py", args=generator_args, cwd="HR-VITON-main", exclusive=True,
+                deps=["pose", "seg_grayscale", "densepose_image", "cloth_mask"],
+                inputs=[HR_VITON_DATA_DIR], outputs=[os.path.join("HR-VITON-main", "Output")]),
+    Stage("composite", composite, deps=["generator"],
+          inputs=[os.path.join("HR-VITON-main", "Output")], outputs=lambda ctx: ctx['results']),
+]
+
+STAGES = [
+    Stage("prepare_human", prepare_human, inputs=[lambda ctx: ctx['human_image_path']],
+          outputs=["origin.jpg", GRAPHONOMY_INPUT]),
+    Stage("human_cache", check_human_cache, deps=["prepare_human"]),
+] + HUMAN_STAGES + CLOTH_STAGES + TRYON_STAGES
+
+# Only what the generator reads is cached: everything the scripts put under
+# HR-VITON's test/test/ except the cloth folders, plus the in-memory arrays.
+CLOTH_DATA_DIRS = {"cloth", "cloth-mask"}
+HUMAN_ARRAYS = ("ori_img", "mask_img")
+
+human_cache = DiskArtifactCache(
+    os.path.join(settings.VTON_CACHE_ROOT, "human"), settings.VTON_HUMAN_CACHE_MAX_BYTES, name="human-cache"
+)
+
+cloth_cache = DiskArtifactCache(
+    os.path.join(settings.VTON_CACHE_ROOT, "cloth"), settings.VTON_CLOTH_CACHE_MAX_BYTES, name="cloth-cache"
+)
+
+# Finished composites keyed by (human upload, cloth upload, quality tier); see jobs.execute_tryon
+result_cache = DiskArtifactCache(
+    os.path.join(settings.VTON_CACHE_ROOT, "results"), settings.VTON_RESULT_CACHE_MAX_BYTES, name="result-cache"
+)
+RESULT_FILE = "result.png"
+
+def store_human_artifacts(ctx):
+    files = {}
+    data_dir = os.path.join(ctx['root'], HR_VITON_DATA_DIR)
+    for name in os.listdir(data_dir):
+        if name not in CLOTH_DATA_DIRS:
+            files[os.path.join(HR_VITON_DATA_DIR, name)] = os.path.join(data_dir, name)
+
+    arrays_path = os.path.join(ctx['root'], "human_arrays.npz")
+    np.savez(arrays_path, **{name: ctx[name] for name in HUMAN_ARRAYS})
+    files["human_arrays.npz"] = arrays_path
+    human_cache.put(ctx['human_key'], files)
+
+def restore_human_artifacts(entry, ctx):
+    """Copy a cached entry into the workspace; copies, so scripts can't overwrite the cache."""
+    for name in os.listdir(entry):
+        source = os.path.join(entry, name)
+        if name == "human_arrays.npz":
+            with np.load(source) as arrays:
+                ctx.update({key: arrays[key] for key in HUMAN_ARRAYS})
+        elif os.path.isdir(source):
+            shutil.copytree(source, os.path.join(ctx['root'], name), dirs_exist_ok=True)
+        else:
+            shutil.copy(source, os.path.join(ctx['root'], name))
+
+def store_cloth_artifacts(cloth_key, ctx):
+    data_dir = os.path.join(ctx['root'], HR_VITON_DATA_DIR)
+    cloth_cache.put(cloth_key, {name: os.path.join(data_dir, name) for name in CLOTH_DATA_DIRS
+                                if os.path.exists(os.path.join(data_dir, name))})
+
+def restore_cloth_artifacts(entry, ctx):
+    shutil.copytree(entry, os.path.join(ctx['root'], HR_VITON_DATA_DIR), dirs_exist_ok=True)
+
+def run_virtual_tryon_pipeline(human_image_path, cloth_image_paths, workspace, on_stage=None, quality="full"):
+    """
+    Try every cloth in `cloth_image_paths` on one person inside the job's
+    `workspace` (see workspace.py). Human stages run once and the generator
+    renders all cloths in a single batch at the `quality` tier's resolution.
+    Model-backed stages execute in long-lived worker processes and independent
+    branches run concurrently (see engine.run_dag).
+    Callers hold one of the VTON_MAX_CONCURRENT_JOBS `tryon_slots` (see workspace.py),
+    taken before the workspace is created.
+    `on_stage(name, finished)` reports progress (see engine.run_dag).
+    Returns (PNG bytes of the final composite or None for each cloth, timings),
+    where timings holds per-stage metrics and the job's critical path.
+    """
+    ctx = {
+        'root': workspace.root,
+        'human_image_path': os.path.abspath(human_image_path),
+        'cloths': [],
+        'quality': quality,
+    }
+    for index, cloth_image_path in enumerate(cloth_image_paths):
+        with open(cloth_image_path, 'rb') as f:
+            cloth_key = content_hash(f.read())
+        ctx['cloths'].append({'path': os.path.abspath(cloth_image_path), 'key': cloth_key, 'name': cloth_name(index)})
+
+    # One graph: the cloth branch starts beside prepare_human, and the human-cache check is
+    # a node that skips the human stages on a hit
+    write_data_list(ctx)
+    run_dag(STAGES, ctx, on_stage=on_stage)
+    if not ctx['human_cached']:
+        store_human_artifacts(ctx)
+
+    timings = ctx['timings']
+    timings['criticalPath'] = critical_path(STAGES, timings['stages'])
+    timings['total'] = max((t["end"] for t in timings['stages'].values()), default=0)
+    return ctx['results'], timings
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import urllib.request
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+
+class WeightStoreError(Exception):
+    pass
+
+
+class WeightFile:
+    """
+    One checkpoint the try-on stages load. It comes either from `source`, a path
+    under VTON_MODEL_DIR where the model checkout ships it, or from `url`.
+    `sha256_prefix` pins files whose publisher states a hash (detectron2 names
+    its model-zoo files after their SHA-256).
+    """
+
+    def __init__(self, name, filename, source=None, url=None, sha256_prefix=''):
+        self.name = name
+        self.filename = filename
+        self.source = source
+        self.url = url
+        self.sha256_prefix = sha256_prefix
+
+
+WEIGHTS = {weight.name: weight for weight in [
+    WeightFile('graphonomy', 'graphonomy_inference.pth', source=os.path.join('Graphonomy-master', 'inference.pth')),
+    WeightFile('tocg', 'mtviton.pth', source=os.path.join('HR-VITON-main', 'mtviton.pth')),
+    WeightFile('generator', 'gen.pth', source=os.path.join('HR-VITON-main', 'gen.pth')),
+    WeightFile(
+        'densepose', 'densepose_rcnn_R_50_FPN_s1x_model_final_162be9.pkl',
+        url="https://dl.fbaipublicfiles.com/densepose/densepose_rcnn_R_50_FPN_s1x/165712039/model_final_162be9.pkl",
+        sha256_prefix='162be9',
+    ),
+]}
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WeightStore:
+    """
+    Local, checksummed copies of every VTON checkpoint under VTON_WEIGHTS_DIR,
+    so try-ons never touch the network. manifest.json records each file's
+    SHA-256 and size when it is fetched (manage.py fetch_vton_weights).
+    Lookups only compare sizes; `verify` rehashes.
+    """
+
+    def __init__(self, root, model_dir):
+        self.root = root
+        self.model_dir = model_dir
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._warned = set()
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def manifest(self):
+        with self._lock:
+            if self._manifest is None:
+                try:
+                    with open(self._manifest_path()) as f:
+                        self._manifest = json.load(f)
+                except FileNotFoundError:
+                    self._manifest = {}
+            return self._manifest
+
+    def _save_manifest(self, manifest):
+        tmp_path = f"{self._manifest_path()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path())
+        with self._lock:
+            self._manifest = manifest
+
+    def stored(self, name):
+        """Whether the checkpoint is in the store with the size recorded when it was fetched."""
+        record = self.manifest().get(name)
+        path = os.path.join(self.root, WEIGHTS[name].filename)
+        return record is not None and os.path.exists(path) and os.path.getsize(path) == record['size']
+
+    def path(self, name):
+        """
+        Absolute path of a verified-at-fetch local checkpoint. Until the store has
+        been filled, a checkpoint that ships in the model checkout is used from
+        there, unverified and with a warning; anything else raises WeightStoreError,
+        so try-ons never download weights.
+        """
+        weight = WEIGHTS[name]
+        path = os.path.join(self.root, weight.filename)
+        record = self.manifest().get(name)
+        if record is None or not os.path.exists(path):
+            return self._checkout_fallback(weight)
+        if os.path.getsize(path) != record['size']:
+            raise WeightStoreError(f"Checkpoint '{name}' changed since it was fetched; run manage.py fetch_vton_weights --verify")
+        return path
+
+    def _checkout_fallback(self, weight):
+        location = os.path.join(self.model_dir, weight.source) if weight.source else None
+        if location is None or not os.path.exists(location):
+            raise WeightStoreError(f"Checkpoint '{weight.name}' is not in {self.root}; run manage.py fetch_vton_weights")
+        with self._lock:
+            warn = weight.name not in self._warned
+            self._warned.add(weight.name)
+        if warn:
+            logger.warning(f"Checkpoint '{weight.name}' is not in the weight store, using unverified {location}; "
+                           f"run manage.py fetch_vton_weights")
+        return location
+
+    def fetch(self, name):
+        """Copy or download one checkpoint into the store and record its hash."""
+        weight = WEIGHTS[name]
+        os.makedirs(self.root, exist_ok=True)
+        target = os.path.join(self.root, weight.filename)
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            if weight.source and os.path.exists(os.path.join(self.model_dir, weight.source)):
+                source = os.path.join(self.model_dir, weight.source)
+                try:
+                    os.link(source, tmp_path)  # Same filesystem: no second copy on disk
+                except OSError:
+                    shutil.copyfile(source, tmp_path)
+            elif weight.url:
+                logger.debug(f"Downloading {weight.url}")
+                with urllib.request.urlopen(weight.url) as response, open(tmp_path, 'wb') as f:
+                    shutil.copyfileobj(response, f, length=1024 * 1024)
+            else:
+                raise WeightStoreError(f"No source for checkpoint '{name}': expected {weight.source} under {self.model_dir}")
+
+            digest = sha256_of(tmp_path)
+            if not digest.startswith(weight.sha256_prefix):
+                raise WeightStoreError(f"Checkpoint '{name}' has SHA-256 {digest}, expected {weight.sha256_prefix}...")
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        manifest = dict(self.manifest())
+        manifest[name] = {"file": weight.filename, "sha256": digest, "size": os.path.getsize(target)}
+        self._save_manifest(manifest)
+        return target
+
+    def verify(self, name):
+        """Rehash a stored checkpoint; returns (ok, message)."""
+        record = self.manifest().get(name)
+        path = os.path.join(self.root, WEIGHTS[name].filename)
+        if record is None or not os.path.exists(path):
+            return False, "missing"
+        digest = sha256_of(path)
+        if digest != record['sha256']:
+            return False, f"SHA-256 mismatch ({digest[:12]} != {record['sha256'][:12]})"
+        return True, digest[:12]
+
+
+weight_store = WeightStore(settings.VTON_WEIGHTS_DIR, settings.VTON_MODEL_DIR)
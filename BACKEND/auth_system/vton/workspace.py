@@ -0,0 +1,69 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Directories the stage scripts write into (or resolve `..` from). They are real
+# per-job directories whose children link back to the shared checkout.
+MIRRORED_DIRS = ('Graphonomy-master', 'HR-VITON-main')
+# Per-job outputs that must never be shared, whatever the checkout contains.
+JOB_ONLY_ENTRIES = {
+    '.': {'origin.jpg', 'resized_img.jpg', 'resized_img.png', 'resized_segmentation_img.png',
+          'resized_segmentation_img_gray.png', 'seg_img.png', 'output.pkl', 'output_graphonomy', 'static', 'cloth_items'},
+    'HR-VITON-main': {'test', 'Output'},
+}
+
+tryon_slots = threading.BoundedSemaphore(settings.VTON_MAX_CONCURRENT_JOBS)
+
+
+class Workspace:
+    """
+    An isolated copy-on-write view of VTON_MODEL_DIR for one try-on job.
+    Code and checkpoints are symlinked; every file the pipeline writes lands in
+    the job's own directory, which is removed when the context exits.
+    """
+
+    def __init__(self, source=None, keep=None):
+        self.source = source or settings.VTON_MODEL_DIR
+        self.keep = settings.VTON_KEEP_WORKSPACES if keep is None else keep
+        self.root = None
+
+    def __enter__(self):
+        os.makedirs(settings.VTON_WORKSPACE_ROOT, exist_ok=True)
+        self.root = tempfile.mkdtemp(prefix='job-', dir=settings.VTON_WORKSPACE_ROOT)
+        self._mirror('.')
+        for directory in MIRRORED_DIRS:
+            self._mirror(directory)
+
+        os.makedirs(self.path('static'), exist_ok=True)
+        # The pipeline writes the job's own data list (t2.txt) next to this
+        os.makedirs(self.path('HR-VITON-main', 'test', 'test'), exist_ok=True)
+        return self
+
+    def _mirror(self, relative_dir):
+        source_dir = os.path.join(self.source, relative_dir)
+        target_dir = self.path(relative_dir)
+        os.makedirs(target_dir, exist_ok=True)
+        if not os.path.isdir(source_dir):
+            return
+        skip = JOB_ONLY_ENTRIES.get(relative_dir, set())
+        if relative_dir == '.':
+            skip = skip | set(MIRRORED_DIRS)
+        for entry in os.listdir(source_dir):
+            if entry not in skip:
+                os.symlink(os.path.join(source_dir, entry), os.path.join(target_dir, entry))
+
+    def path(self, *parts):
+        return os.path.normpath(os.path.join(self.root, *parts))
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.keep:
+            logger.debug(f"Keeping VTON workspace {self.root}")
+        else:
+            shutil.rmtree(self.root, ignore_errors=True)
+        return False